@@ -1,2 +1,111 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+
+import mimetypes
+import os
+import zipfile
+from typing import Dict, List
+from xml.etree import ElementTree
+
+OPF_NAMESPACE = "http://www.idpf.org/2007/opf"
+DC_NAMESPACE = "http://purl.org/dc/elements/1.1/"
+
+# media types which mimetypes module doesn't know or guesses differently than EPUB requires
+MEDIA_TYPES = {".html": "application/xhtml+xml", ".xhtml": "application/xhtml+xml", ".ncx": "application/x-dtbncx+xml",
+               ".css": "text/css", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png",
+               ".gif": "image/gif", ".svg": "image/svg+xml", ".webp": "image/webp"}
+
+_CONTAINER_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+    <rootfiles>
+        <rootfile full-path="{opf}" media-type="application/oebps-package+xml"/>
+    </rootfiles>
+</container>
+"""
+
+
+def get_media_type(filename: str) -> str:
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in MEDIA_TYPES:
+        return MEDIA_TYPES[extension]
+    return mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+
+def create_epub_opf(kindle_opf: str, files: List[str]) -> bytes:
+    """
+    Creates EPUB 2 package document from the OPF file rendered for kindlegen
+
+    Dublin Core metadata, spine and guide are taken over, Mobipocket-specific metadata are dropped and every
+    file of the book (images included) is listed in the manifest.
+
+    :param kindle_opf: path to OPF file rendered by `opf.opf` template
+    :param files: paths of all files of the book, relative to the issue folder
+    """
+    ElementTree.register_namespace("", OPF_NAMESPACE)
+    ElementTree.register_namespace("dc", DC_NAMESPACE)
+    source = ElementTree.parse(kindle_opf).getroot()
+    opf = "{" + OPF_NAMESPACE + "}"
+
+    package = ElementTree.Element(opf + "package", {"version": "2.0", "unique-identifier": "uid"})
+    metadata = ElementTree.SubElement(package, opf + "metadata")
+    for dc_element in source.iter():
+        if dc_element.tag.startswith("{" + DC_NAMESPACE + "}"):
+            metadata.append(dc_element)
+
+    cover = source.find(".//{opf}x-metadata/{opf}EmbeddedCover".format(opf=opf))
+    cover_href = cover.text.strip() if cover is not None and cover.text else None
+
+    manifest = ElementTree.SubElement(package, opf + "manifest")
+    listed: Dict[str, str] = {}
+    for item in source.find(opf + "manifest"):
+        attributes = dict(item.attrib)
+        attributes["media-type"] = get_media_type(attributes["href"])
+        ElementTree.SubElement(manifest, opf + "item", attributes)
+        listed[attributes["href"]] = attributes["id"]
+    for resource_no, href in enumerate(sorted(set(files) - set(listed))):
+        item_id = "cover-image" if href == cover_href else "resource_{no:04d}".format(no=resource_no + 1)
+        ElementTree.SubElement(manifest, opf + "item", {"id": item_id, "href": href,
+                                                         "media-type": get_media_type(href)})
+        listed[href] = item_id
+    if cover_href in listed:
+        ElementTree.SubElement(metadata, opf + "meta", {"name": "cover", "content": listed[cover_href]})
+
+    spine = ElementTree.SubElement(package, opf + "spine", dict(source.find(opf + "spine").attrib))
+    # title page goes first in EPUB readers, kindlegen uses the embedded cover instead
+    if "title.html" in listed:
+        ElementTree.SubElement(spine, opf + "itemref", {"idref": listed["title.html"]})
+    for itemref in source.find(opf + "spine"):
+        spine.append(itemref)
+    guide = source.find(opf + "guide")
+    if guide is not None:
+        package.append(guide)
+    return ElementTree.tostring(package, encoding="utf-8", xml_declaration=True)
+
+
+def create_epub(issue_dir: str, epub_file: str, opf_name: str = "respekt.opf",
+                exclude: tuple = ("manifest.json", "optimization.json")) -> str:
+    """
+    Packs rendered issue folder into EPUB 2 container
+
+    :param issue_dir: folder with rendered issue (OPF, NCX, XHTML files and resources)
+    :param epub_file: path of created EPUB file
+    :param opf_name: name of OPF file (rendered for kindlegen) in issue folder
+    :param exclude: names of files in issue folder which don't belong to the book
+    :return: path of created EPUB file
+    """
+    files = []
+    for root, dirs, filenames in os.walk(issue_dir):
+        for filename in sorted(filenames):
+            if filename.startswith(".") or filename in exclude or filename == opf_name:
+                continue
+            files.append(os.path.relpath(os.path.join(root, filename), issue_dir).replace(os.sep, "/"))
+    epub_opf = create_epub_opf(os.path.join(issue_dir, opf_name), files)
+
+    with zipfile.ZipFile(epub_file, mode="w", compression=zipfile.ZIP_DEFLATED) as epub:
+        # 'mimetype' has to be the first file in the archive and must not be compressed
+        epub.writestr("mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+        epub.writestr("META-INF/container.xml", _CONTAINER_XML.format(opf="content.opf"))
+        epub.writestr("content.opf", epub_opf)
+        for filename in files:
+            epub.write(os.path.join(issue_dir, filename), filename)
+    return epub_file
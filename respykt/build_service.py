@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import mimetypes
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from shutil import rmtree
+from socketserver import ThreadingMixIn
+from time import time
+from typing import Dict, Iterator, Optional, Tuple, Union
+from urllib.parse import urlparse, parse_qs, unquote
+
+from .binding.epub import create_epub
+from .respykt import Respykt, StringDict
+from .utils import log_error, log_info
+
+BuildKey = Tuple[str, str]
+
+
+class IssueBuild:
+    """
+    State of a single issue build, shared by all requests asking for the same issue
+    """
+    year: str = None
+    number: str = None
+    state: str = None
+    stage: str = None
+    articles_done: int = 0
+    articles_total: int = 0
+    # number of requests using the build at the moment
+    users: int = 0
+    error: str = None
+    issue_dir: str = None
+    epub_file: str = None
+    started: float = None
+    finished_at: float = None
+    finished: threading.Event = None
+
+    def __init__(self, year: str, number: str, issue_dir: str, epub_file: str) -> None:
+        self.year = year
+        self.number = number
+        self.issue_dir = issue_dir
+        self.epub_file = epub_file
+        self.state = "queued"
+        self.started = time()
+        self.finished = threading.Event()
+
+    def status(self) -> Dict[str, Union[str, int, float, None]]:
+        return {"year": self.year, "number": self.number, "state": self.state, "stage": self.stage,
+                "articles_done": self.articles_done, "articles_total": self.articles_total,
+                "error": self.error, "started": self.started, "finished": self.finished_at}
+
+
+class BuildService:
+    """
+    Builds issues on request, at most once for every issue at the same time, and keeps finished builds cached
+
+    Only the `max_cached` most recently requested builds are kept, older ones are deleted from disk. Failed builds
+    are not kept at all. Builds found in `cache_dir` on start are reused, so the cache survives restarts.
+    """
+    config_file: str = None
+    cache_dir: str = None
+    max_cached: int = None
+    home_url: str = None
+    builds: "OrderedDict[BuildKey, IssueBuild]" = None
+    lock: threading.Lock = None
+
+    _epub_name_pattern = re.compile(r"^respekt_([0-9]{4})_([0-9]+)\.epub$")
+    _issue_dir_pattern = re.compile(r"^([0-9]{4})_([0-9]+)$")
+
+    def __init__(self, config_file: str = None, cache_dir: str = "builds", max_cached: int = 8,
+                 home_url: str = None) -> None:
+        self.config_file = config_file
+        self.cache_dir = cache_dir
+        self.max_cached = max_cached
+        self.home_url = home_url
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        self.builds = OrderedDict()
+        self.lock = threading.Lock()
+        self.load_cached()
+
+    def get_build_paths(self, key: BuildKey) -> Tuple[str, str]:
+        return (os.path.join(self.cache_dir, "{0}_{1}".format(*key)),
+                os.path.join(self.cache_dir, "respekt_{0}_{1}.epub".format(*key)))
+
+    def load_cached(self) -> None:
+        """
+        Registers builds left in cache folder by previous run, least recently built first
+
+        Issue folders without EPUB belong to builds interrupted by the restart, so they are deleted.
+        """
+        cached = []
+        for filename in os.listdir(self.cache_dir):
+            epub_match = self._epub_name_pattern.match(filename)
+            if epub_match is None:
+                continue
+            key = (str(int(epub_match.group(1))), str(int(epub_match.group(2))))
+            issue_dir, epub_file = self.get_build_paths(key)
+            if not os.path.isdir(issue_dir):
+                # rendered files are served too, EPUB alone is not enough
+                os.remove(epub_file)
+                continue
+            build = IssueBuild(year=key[0], number=key[1], issue_dir=issue_dir, epub_file=epub_file)
+            build.state = "done"
+            build.started = build.finished_at = os.path.getmtime(epub_file)
+            build.finished.set()
+            cached.append(build)
+        for build in sorted(cached, key=lambda build: build.finished_at):
+            self.builds[(build.year, build.number)] = build
+        for filename in os.listdir(self.cache_dir):
+            dir_match = self._issue_dir_pattern.match(filename)
+            if dir_match is None or not os.path.isdir(os.path.join(self.cache_dir, filename)):
+                continue
+            if (str(int(dir_match.group(1))), str(int(dir_match.group(2)))) not in self.builds:
+                log_info("removing unfinished build '{folder}'".format(folder=filename))
+                rmtree(os.path.join(self.cache_dir, filename), ignore_errors=True)
+        if cached:
+            log_info("reusing {count} cached builds".format(count=len(cached)))
+        self._evict()
+
+    def request_build(self, year: Union[str, int], number: Union[str, int]) -> IssueBuild:
+        """
+        Returns build of the issue, starting a new one only if it is neither cached nor running
+        """
+        with self.lock:
+            build, is_new = self._get_build(year, number)
+        if is_new:
+            self._start(build)
+        return build
+
+    @contextmanager
+    def use_build(self, year: Union[str, int], number: Union[str, int]) -> Iterator[IssueBuild]:
+        """
+        Like `request_build`, but the build is not evicted until the caller is done with it
+        """
+        with self.lock:
+            build, is_new = self._get_build(year, number)
+            build.users += 1
+        if is_new:
+            self._start(build)
+        try:
+            yield build
+        finally:
+            with self.lock:
+                build.users -= 1
+                self._evict()
+
+    def _get_build(self, year: Union[str, int], number: Union[str, int]) -> Tuple[IssueBuild, bool]:
+        key = (str(int(year)), str(int(number)))
+        build = self.builds.get(key)
+        if build is not None:
+            self.builds.move_to_end(key)
+            return build, False
+        issue_dir, epub_file = self.get_build_paths(key)
+        build = IssueBuild(year=key[0], number=key[1], issue_dir=issue_dir, epub_file=epub_file)
+        self.builds[key] = build
+        return build, True
+
+    def _start(self, build: IssueBuild) -> None:
+        log_info("starting build of issue {number}/{year}".format(number=build.number, year=build.year))
+        threading.Thread(target=self._build, args=(build,), daemon=True).start()
+
+    def _evict(self, keep: IssueBuild = None) -> None:
+        # running builds, builds used by requests and the one just finished are never evicted,
+        # oldest finished ones go first
+        evictable = [key for key, build in self.builds.items()
+                     if build.state == "done" and build.users == 0 and build is not keep]
+        for key in evictable[:max(len(self.builds) - self.max_cached, 0)]:
+            build = self.builds.pop(key)
+            log_info("evicting build of issue {number}/{year}".format(number=build.number, year=build.year))
+            self._remove_files(build)
+
+    def _finish(self, build: IssueBuild) -> None:
+        with self.lock:
+            if build.state == "failed":
+                # failed build is not cached, next request of the issue starts it again
+                if self.builds.get((build.year, build.number)) is build:
+                    del self.builds[(build.year, build.number)]
+                self._remove_files(build)
+            else:
+                self._evict(keep=build)
+
+    @staticmethod
+    def _remove_files(build: IssueBuild) -> None:
+        if os.path.isdir(build.issue_dir):
+            rmtree(build.issue_dir, ignore_errors=True)
+        if os.path.isfile(build.epub_file):
+            os.remove(build.epub_file)
+        # default folder of profiling reports, when profiling is enabled
+        if os.path.isdir(build.issue_dir + "_profile"):
+            rmtree(build.issue_dir + "_profile", ignore_errors=True)
+
+    @staticmethod
+    def _track_articles(build: IssueBuild, articles: Iterator[StringDict]) -> Iterator[StringDict]:
+        for article in articles:
+            yield article
+            build.articles_done += 1
+
+    def _build(self, build: IssueBuild) -> None:
+        build.state = "running"
+        try:
+            respykt = Respykt(self.config_file, issue_dir=build.issue_dir, home_url=self.home_url)
+            respykt.set_issue(build.year, build.number)
+
+            def on_stage(name: str) -> None:
+                build.stage = name
+                if respykt.articles is not None:
+                    build.articles_total = len(respykt.articles)
+
+            respykt.run(stream=True, on_stage=on_stage,
+                        article_wrapper=lambda articles: self._track_articles(build, articles))
+            build.stage = "epub"
+            create_epub(build.issue_dir, build.epub_file)
+            build.state = "done"
+        except Exception as e:
+            # any failure of the scrape must end the build, otherwise waiting requests would hang
+            log_error("BuildService::_build: build of issue {number}/{year} failed: {e}".format(
+                number=build.number, year=build.year, e=repr(e)))
+            build.state = "failed"
+            build.error = repr(e)
+        finally:
+            build.stage = None
+            build.finished_at = time()
+            try:
+                self._finish(build)
+            finally:
+                build.finished.set()
+
+    def list_builds(self):
+        with self.lock:
+            return [build.status() for build in self.builds.values()]
+
+
+class BuildRequestHandler(BaseHTTPRequestHandler):
+    """
+    Routes:
+        GET /issues                                  - status of all cached builds
+        GET /issues/{year}/{number}                  - status of the build, starts it if needed
+        GET /issues/{year}/{number}/epub[?wait=1]    - built EPUB file
+        GET /issues/{year}/{number}/files/{path}     - file of rendered issue folder
+    """
+    server: "BuildServer"
+
+    _route_pattern = re.compile(r"^/issues/([0-9]{4})/([0-9]{1,3})(?:/(epub|files)(?:/(.*))?)?/?$")
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path.rstrip("/") == "/issues":
+            self.send_json(200, self.server.service.list_builds())
+            return
+        match = self._route_pattern.match(url.path)
+        if match is None:
+            self.send_json(404, {"error": "unknown path"})
+            return
+        year, number, artifact, path = match.groups()
+        with self.server.service.use_build(year, number) as build:
+            if artifact is not None and query.get("wait", ["0"])[0] not in ("", "0"):
+                build.finished.wait(timeout=self.server.wait_timeout)
+
+            if build.state == "failed":
+                self.send_json(500, build.status())
+            elif build.state != "done":
+                self.send_json(202, build.status())
+            elif artifact is None:
+                self.send_json(200, build.status())
+            elif artifact == "epub":
+                self.send_file(build.epub_file, "application/epub+zip")
+            else:
+                self.send_issue_file(build, unquote(path or ""))
+
+    def send_issue_file(self, build: IssueBuild, path: str) -> None:
+        issue_dir = os.path.abspath(build.issue_dir)
+        filepath = os.path.abspath(os.path.join(issue_dir, path))
+        # don't let requests escape from the issue folder
+        if not filepath.startswith(issue_dir + os.sep) or not os.path.isfile(filepath):
+            self.send_json(404, {"error": "file not found"})
+            return
+        self.send_file(filepath, mimetypes.guess_type(filepath)[0] or "application/octet-stream")
+
+    def send_file(self, filepath: str, content_type: str) -> None:
+        try:
+            with open(filepath, mode="rb") as fr:
+                data = fr.read()
+        except FileNotFoundError:
+            # removed from cache folder behind the service's back
+            self.send_json(404, {"error": "file not found"})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_json(self, code: int, data) -> None:
+        body = json.dumps(data, ensure_ascii=False).encode("utf8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format_: str, *args) -> None:
+        log_info("build service: " + format_ % args)
+
+
+class BuildServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    service: BuildService = None
+    wait_timeout: Optional[float] = None
+
+    def __init__(self, address: Tuple[str, int], service: BuildService, wait_timeout: float = 600) -> None:
+        super().__init__(address, BuildRequestHandler)
+        self.service = service
+        self.wait_timeout = wait_timeout
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local HTTP service building Respekt issues")
+    parser.add_argument("--config", default=None, help="path to the config file")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--cache-dir", default="builds", help="folder for built issues")
+    parser.add_argument("--max-cached", type=int, default=8, help="number of issues kept in cache")
+    parser.add_argument("--home-url", default=None, help="URL of respekt.cz or of a local stand-in")
+    args = parser.parse_args()
+
+    service = BuildService(config_file=args.config, cache_dir=args.cache_dir, max_cached=args.max_cached,
+                           home_url=args.home_url)
+    server = BuildServer((args.host, args.port), service)
+    log_info("build service listening on http://{host}:{port}/".format(host=args.host, port=args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import re
+from datetime import date
+from shutil import copymode
+from time import sleep, time
+from typing import Dict, List, Optional, Union
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+from .output_writer import create_temp_file
+from .request_soap import RequestSoap
+from .respykt import Respykt, StringDict
+from .utils import get_text, log_error, log_info
+
+# first volume of Respekt
+FIRST_YEAR = 1990
+
+
+class IssueIndex:
+    """
+    Cached index of all issues in the archive, stored as JSON file
+
+    Every year listing (`/tydenik/{year}`) is crawled only once, except the current year, which is refreshed
+    incrementally - only issues missing in the index are downloaded. Each issue record holds its number,
+    date range, title, cover URL and number of articles, so issues can be resolved without hitting the site.
+    """
+    index_file: str = None
+    home_url: str = None
+    requester: RequestSoap = None
+    wait_time: float = None
+    years: Dict[str, Dict[str, Union[bool, Dict[str, StringDict]]]] = None
+
+    # links to issues, not to their articles
+    _issue_link_pattern = re.compile(r"/tydenik/([0-9]{4})/([0-9]+)/?(?:[?#].*)?$")
+
+    def __init__(self, index_file: str = "issue_index.json", home_url: str = "https://www.respekt.cz/",
+                 requester: RequestSoap = None, wait_time: float = None) -> None:
+        self.index_file = index_file
+        self.home_url = home_url
+        self.requester = requester if requester is not None else RequestSoap()
+        self.wait_time = wait_time
+        self.years = {}
+        self.load()
+
+    @classmethod
+    def from_respykt(cls, respykt: Respykt) -> "IssueIndex":
+        """
+        Creates index using settings (index file, home URL, wait time) and session of Respykt instance
+        """
+        return cls(index_file=respykt.index_file, home_url=respykt.url["home"], requester=respykt.requester,
+                   wait_time=respykt.dl_wait_time)
+
+    def load(self) -> None:
+        if not os.path.isfile(self.index_file):
+            return
+        try:
+            with open(self.index_file, mode="r", encoding="utf-8") as fr:
+                self.years = json.load(fr)["years"]
+        except (OSError, ValueError, KeyError) as e:
+            log_error("IssueIndex::load: cannot read index '{index}': {e}".format(index=self.index_file, e=str(e)))
+            self.years = {}
+
+    def save(self) -> None:
+        # write to temporary file first, so an interrupted crawl doesn't destroy the whole index
+        index_dir = os.path.dirname(self.index_file) or "."
+        fd, temp_path = create_temp_file(index_dir)
+        try:
+            with os.fdopen(fd, mode="w", encoding="utf-8") as fw:
+                json.dump({"updated": time(), "years": self.years}, fw, ensure_ascii=False, indent=1,
+                          sort_keys=True)
+            if os.path.exists(self.index_file):
+                copymode(self.index_file, temp_path)
+            os.replace(temp_path, self.index_file)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def get_year_url(self, year: Union[str, int]) -> str:
+        return "{home}tydenik/{year}".format(home=self.home_url, year=year)
+
+    def get_issue_url(self, year: Union[str, int], number: Union[str, int]) -> str:
+        return "{home}tydenik/{year}/{number}".format(home=self.home_url, year=year, number=number)
+
+    def _wait(self) -> None:
+        if self.wait_time is not None:
+            sleep(self.wait_time)
+
+    def list_year_issues(self, year: Union[str, int]) -> Optional[List[str]]:
+        """
+        Returns numbers of issues linked from the year listing page, None if the page cannot be downloaded
+        """
+        year_page = self.requester.get(self.get_year_url(year))
+        if year_page is None:
+            log_error("IssueIndex::list_year_issues: cannot get listing of year {year}".format(year=year))
+            return None
+        numbers = set()
+        for link in year_page.find_all("a", href=True):
+            link_match = self._issue_link_pattern.search(link["href"])
+            if link_match is not None and link_match.group(1) == str(year):
+                numbers.add(str(int(link_match.group(2))))
+        return sorted(numbers, key=int)
+
+    @staticmethod
+    def parse_issue_page(toc_page: BeautifulSoup, year: str, number: str, url: str) -> StringDict:
+        hero = toc_page.find(class_="heroissue")
+        datestring = get_text(hero.find("time", class_="heroissue-date"))
+        date_from, date_to = Respykt.get_date_range_from_datestring(datestring)
+        return {"year": year, "number": number, "url": url,
+                "title": get_text(hero.h2),
+                "subtitle": get_text(hero.find("div", class_="heroissue-theme")),
+                "cover_url": urljoin(url, hero.a["href"]),
+                "datestring": datestring,
+                "date": Respykt.get_date_from_datestring(datestring),
+                "date_from": date_from, "date_to": date_to,
+                "articles_count": len(toc_page(class_="issuedetail-categorized-item"))}
+
+    def crawl_year(self, year: Union[str, int]) -> int:
+        """
+        Adds issues of the year missing in the index
+
+        :return: number of added issues
+        """
+        year = str(year)
+        year_record = self.years.setdefault(year, {"complete": False, "issues": {}})
+        numbers = self.list_year_issues(year)
+        if numbers is None:
+            return 0
+        added = 0
+        failed = False
+        for number in numbers:
+            if number in year_record["issues"]:
+                continue
+            self._wait()
+            url = self.get_issue_url(year, number)
+            toc_page = self.requester.get(url)
+            try:
+                year_record["issues"][number] = self.parse_issue_page(toc_page, year, number, url)
+            except (AttributeError, TypeError, KeyError) as e:
+                # page without issue header, try again next time
+                log_error("IssueIndex::crawl_year: cannot parse issue {number}/{year}: {e}".format(
+                    number=number, year=year, e=str(e)))
+                failed = True
+                continue
+            added += 1
+            log_info("indexed issue {number}/{year}: '{title}'".format(number=number, year=year,
+                                                                      title=year_record["issues"][number]["title"]))
+        # past years don't change anymore, so they don't need to be crawled again
+        year_record["complete"] = int(year) < date.today().year and not failed
+        self.save()
+        return added
+
+    def crawl(self, first_year: int = FIRST_YEAR, last_year: int = None) -> int:
+        """
+        Crawls all years not crawled completely yet, including the current one
+
+        :return: number of added issues
+        """
+        if last_year is None:
+            last_year = date.today().year
+        added = 0
+        for year in range(first_year, last_year + 1):
+            year_record = self.years.get(str(year))
+            if year_record is not None and year_record["complete"]:
+                continue
+            added += self.crawl_year(year)
+        return added
+
+    def refresh(self) -> int:
+        """
+        Adds new issues of the current year
+        """
+        return self.crawl_year(date.today().year)
+
+    def get(self, year: Union[str, int], number: Union[str, int]) -> Optional[StringDict]:
+        year_record = self.years.get(str(year))
+        if year_record is None:
+            return None
+        return year_record["issues"].get(str(int(number)))
+
+    def issues(self) -> List[StringDict]:
+        """
+        Returns all indexed issues ordered by date
+        """
+        return sorted((issue for year_record in self.years.values() for issue in year_record["issues"].values()),
+                      key=lambda issue: issue["date_from"])
+
+    def find_by_date(self, day: Union[str, date]) -> Optional[StringDict]:
+        """
+        Returns issue, which was current on the day (given as date or ISO string, like '2019-02-27')
+        """
+        if isinstance(day, date):
+            day = day.isoformat()
+        for issue in self.issues():
+            if issue["date_from"] <= day <= issue["date_to"]:
+                return issue
+        return None
+
+    def latest(self) -> Optional[StringDict]:
+        issues = self.issues()
+        return issues[-1] if issues else None
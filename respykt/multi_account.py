@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import configparser
+import os
+import re
+from copy import deepcopy
+from typing import List
+
+from .output_writer import IncrementalWriter
+from .respykt import Respykt, StringDict
+from .utils import log_error, log_info
+
+
+class MultiRespykt:
+    """
+    Builds the same issue for several subscriber accounts.
+
+    TOC page, unlocked articles and resources are fetched once by anonymous `shared` instance, only locked
+    articles are downloaded again by every account. Each account gets its own output folder inside the issue
+    folder, named by the username.
+    """
+    config_file: str = None
+    accounts: List[StringDict] = None
+    shared: Respykt = None
+    editions: List[Respykt] = None
+
+    _account_section_pattern = re.compile(r"^LOGIN(?:[ :.](.+))?$")
+
+    def __init__(self, config_file: str = None, accounts: List[StringDict] = None):
+        self.config_file = config_file
+        self.accounts = []
+        if config_file:
+            self.load_accounts_from_file(config_file)
+        if accounts is not None:
+            self.accounts.extend(accounts)
+
+        self.shared = Respykt(config_file)
+        # public content is fetched without login, locked articles are kept and downloaded per account
+        self.shared.user = {}
+        self.shared.skip_locked = False
+        self.editions = []
+
+    def load_accounts_from_file(self, config_file: str) -> None:
+        """
+        Reads accounts from config sections '[LOGIN]' and '[LOGIN:name]', each with 'username' and 'password'
+
+        Account from the plain '[LOGIN]' section (the one used by single-account builds) goes first.
+        """
+        if not os.path.exists(config_file):
+            log_error("MultiRespykt::load_accounts_from_file: File '{config}' does not exist".format(
+                config=config_file))
+            return
+        config = configparser.ConfigParser()
+        config.read(config_file)
+        sections = [section for section in config.sections() if self._account_section_pattern.match(section)]
+        sections.sort(key=lambda section: section != "LOGIN")
+        for section in sections:
+            username = config[section].get("username", "")
+            if username == "" or config[section].get("password", "") == "":
+                continue
+            if any(account["username"] == username for account in self.accounts):
+                continue
+            self.accounts.append({"username": username, "password": config[section]["password"]})
+
+    def set_issue(self, year, number):
+        self.shared.set_issue(year, number)
+
+    @staticmethod
+    def get_account_folder_name(username: str) -> str:
+        return re.sub(r"[^\w.-]", "_", username)
+
+    def create_edition(self, account: StringDict) -> Respykt:
+        edition = Respykt(self.config_file)
+        edition.user = account
+        edition.url = dict(self.shared.url)
+        edition.folder = dict(self.shared.folder)
+        edition.folder["issue"] = os.path.join(self.shared.folder["issue"],
+                                               self.get_account_folder_name(account["username"]))
+        edition.folder["issue_res"] = os.path.join(edition.folder["issue"], "resources")
+        for folder in (edition.folder["issue"], edition.folder["issue_res"]):
+            if not os.path.isdir(folder):
+                os.mkdir(folder)
+        # resources of all accounts are collected and downloaded by single downloader, so they are not duplicated
+        edition.downloader = self.shared.downloader
+        edition.profiler = self.shared.profiler
+        edition.writer = IncrementalWriter(base_dir=edition.folder["issue"])
+        # edition keeps its own optimizer, so its report counts only locked articles and CSS of this account
+
+        # copying whole issue at once keeps articles in categories the same objects as in article list
+        edition.issue = deepcopy(self.shared.issue)
+        edition.articles = edition.issue["articles"]
+        edition.categories = edition.issue["categories"]
+        edition.set_uid()
+        return edition
+
+    def download_locked_articles(self, edition: Respykt) -> None:
+        """
+        Downloads locked articles with the account's session, leaving out those the account cannot read
+
+        The first locked article tells whether the account has subscription at all, so accounts without it
+        don't download the other ones.
+        """
+        locked = [art for art in edition.articles if art["is_locked"]]
+        if not locked:
+            return
+        edition.download_article(locked[0])
+        if locked[0]["is_paywalled"]:
+            log_info("user '{username}' cannot read locked articles, leaving them out".format(
+                username=edition.user["username"]))
+            self.remove_articles(edition, locked)
+            return
+        edition.download_articles(locked[1:])
+        self.remove_articles(edition, [art for art in locked if art["is_paywalled"]])
+
+    @staticmethod
+    def remove_articles(edition: Respykt, articles: List[StringDict]) -> None:
+        if not articles:
+            return
+        removed = set(id(art) for art in articles)
+        # lists are shared with edition.issue, so they are changed in place
+        edition.articles[:] = [art for art in edition.articles if id(art) not in removed]
+        for category in edition.categories:
+            category["articles"] = [art for art in category["articles"] if id(art) not in removed]
+        edition.categories[:] = [category for category in edition.categories if category["articles"]]
+        # numbering without gaps, TOC and OPF start with the first article
+        edition.number_articles()
+
+    def copy_shared_res(self, edition: Respykt) -> None:
+        source_dir = self.shared.downloader.data_directory
+        log_info("linking shared resources to '{dest}'".format(dest=edition.folder["issue_res"]))
+        for filename in os.listdir(source_dir):
+            edition.writer.link_file(os.path.join(source_dir, filename),
+                                     os.path.join(edition.folder["issue_res"], filename))
+
+    def run(self):
+        if not self.accounts:
+            log_error("MultiRespykt::run: no accounts to build the issue for")
+            return
+        profiler = self.shared.profiler
+        profiler.stages = []
+        with profiler.stage("parse_toc_page"):
+            self.shared.parse_toc_page()
+        with profiler.stage("download_articles"):
+            self.shared.download_articles([art for art in self.shared.articles if not art["is_locked"]])
+
+        self.editions = []
+        for account in self.accounts:
+            log_info("building issue for user '{username}'".format(username=account["username"]))
+            edition = self.create_edition(account)
+            account_name = self.get_account_folder_name(account["username"])
+            with profiler.stage("login_" + account_name):
+                edition.login()
+            with profiler.stage("download_locked_articles_" + account_name):
+                self.download_locked_articles(edition)
+            self.editions.append(edition)
+
+        with profiler.stage("download_resources"):
+            self.shared.download_resources()
+        for edition in self.editions:
+            account_name = self.get_account_folder_name(edition.user["username"])
+            with profiler.stage("write_files_" + account_name):
+                edition.write_files()
+            with profiler.stage("copy_static_res_" + account_name):
+                self.copy_shared_res(edition)
+                edition.copy_static_res()
+            edition.writer.save_manifest()
+            if edition.optimizer is not None:
+                edition.optimizer.write_report(edition.folder["issue"])
+        # articles shared by all accounts are counted once, in report of the whole issue
+        if self.shared.optimizer is not None:
+            self.shared.optimizer.write_report(self.shared.folder["issue"])
+        profiler.write_summary()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import re
+from typing import Dict, List, Set, Tuple
+
+from bs4 import BeautifulSoup
+from bs4.element import Comment, Tag
+
+from .output_writer import IncrementalWriter
+from .utils import log_info
+
+# elements which are never displayed by e-readers or which only serve the web page
+REMOVED_ELEMENTS = ("script", "style", "noscript", "iframe", "form", "input", "button", "select", "textarea",
+                    "link", "meta", "svg", "object", "embed", "video", "audio")
+# attributes kept on article elements, all others (data-*, style, on*, ...) are removed
+KEPT_ATTRIBUTES = ("href", "src", "alt", "title", "id", "name", "class", "colspan", "rowspan")
+# elements removed when they don't contain any text or image
+EMPTY_REMOVABLE = ("div", "span", "p", "a", "section", "aside", "strong", "em", "b", "i")
+# whitespace between those is not rendered
+BLOCK_ELEMENTS = ("p", "div", "section", "figure", "img", "h1", "h2", "h3", "h4", "h5", "h6", "ul", "ol", "li",
+                  "table", "thead", "tbody", "tr", "td", "th", "hr", "br", "blockquote", "pre")
+# whitespace inside of those is significant
+PREFORMATTED = ("pre", "code", "textarea")
+
+_junk_class_pattern = re.compile(r"(^|[-_])(ad|ads|advert|banner|promo|share|sharing|social|newsletter|"
+                                 r"tracking|related)([-_]|$)", re.IGNORECASE)
+_whitespace_pattern = re.compile(r"\s+")
+_css_delimiter_pattern = re.compile(r"\s*([:;,{}])\s*")
+_css_comment_pattern = re.compile(r"/\*.*?\*/", re.DOTALL)
+_css_class_pattern = re.compile(r"\.(-?[_a-zA-Z][\w-]*)")
+_css_id_pattern = re.compile(r"#(-?[_a-zA-Z][\w-]*)")
+_css_tag_pattern = re.compile(r"(?:^|[\s>+~(])([a-zA-Z][\w-]*)")
+_css_ignored_pattern = re.compile(r"::?[\w-]+(\([^)]*\))?|\[[^\]]*\]")
+
+
+class OutputOptimizer:
+    """
+    Reduces size of the issue - strips unused attributes and elements from article content, minifies it
+    and prunes CSS rules not used by the rendered issue.
+
+    Numbers of bytes before and after optimization are collected in `report`.
+    """
+    static_dir: str = None
+    css_classes: Set[str] = None
+    css_ids: Set[str] = None
+    report: Dict[str, int] = None
+
+    def __init__(self, static_dir: str) -> None:
+        self.static_dir = static_dir
+        self.css_classes = set()
+        self.css_ids = set()
+        self.report = {"articles": 0, "html_bytes_before": 0, "html_bytes_after": 0,
+                       "css_bytes_before": 0, "css_bytes_after": 0}
+        # classes and ids not referenced by any stylesheet are useless in article content
+        for filename in self.list_css_files(static_dir):
+            with open(os.path.join(static_dir, filename), mode="r", encoding="utf-8") as fr:
+                css = _css_comment_pattern.sub("", fr.read())
+            for selector, _ in self.split_css_rules(css):
+                self.css_classes.update(_css_class_pattern.findall(selector))
+                self.css_ids.update(_css_id_pattern.findall(selector))
+
+    @staticmethod
+    def list_css_files(folder: str) -> List[str]:
+        if not os.path.isdir(folder):
+            return []
+        return sorted(filename for filename in os.listdir(folder) if filename.lower().endswith(".css"))
+
+    def optimize_article(self, content: Tag) -> str:
+        """
+        Cleans article content in place and returns it as minified HTML
+        """
+        size_before = len(str(content).encode("utf8"))
+
+        for comment in content.find_all(string=lambda text: isinstance(text, Comment)):
+            comment.extract()
+        for element in content.find_all(REMOVED_ELEMENTS):
+            element.extract()
+        for element in content.find_all(class_=_junk_class_pattern):
+            element.extract()
+        # ids and names used as link targets inside of the article have to stay
+        anchors = {link["href"][1:] for link in content.find_all("a", href=True) if link["href"].startswith("#")}
+        for element in [content] + content.find_all(True):
+            self.strip_attributes(element, anchors)
+        self.remove_empty(content)
+        # merge neighbouring strings left after removed elements
+        content.smooth()
+        self.collapse_whitespace(content)
+
+        result = str(content)
+        self.report["articles"] += 1
+        self.report["html_bytes_before"] += size_before
+        self.report["html_bytes_after"] += len(result.encode("utf8"))
+        return result
+
+    def strip_attributes(self, element: Tag, anchors: Set[str]) -> None:
+        attributes = {}
+        for name, value in element.attrs.items():
+            if name not in KEPT_ATTRIBUTES:
+                continue
+            if name == "class":
+                value = [class_ for class_ in value if class_ in self.css_classes]
+                if not value:
+                    continue
+            elif name == "id" and value not in self.css_ids and value not in anchors:
+                continue
+            elif name == "name" and value not in anchors:
+                continue
+            attributes[name] = value
+        element.attrs = attributes
+
+    @staticmethod
+    def remove_empty(content: Tag) -> None:
+        # go from the deepest elements, so parents emptied by removing their children are removed too
+        for element in reversed(content.find_all(EMPTY_REMOVABLE)):
+            text = element.get_text()
+            if element.find(["img", "br", "hr", "table"]) is not None or text.strip() != "" \
+                    or "id" in element.attrs or "name" in element.attrs:
+                continue
+            if text != "" and element.name not in BLOCK_ELEMENTS:
+                # inline element with only whitespace still separates the words around it
+                element.replace_with(" ")
+            else:
+                element.decompose()
+
+    @staticmethod
+    def _is_block(node) -> bool:
+        return node is None or isinstance(node, Tag) and node.name in BLOCK_ELEMENTS
+
+    def collapse_whitespace(self, content: Tag) -> None:
+        for text in content.find_all(string=True):
+            if text.find_parent(PREFORMATTED) is not None:
+                continue
+            collapsed = _whitespace_pattern.sub(" ", text)
+            if collapsed == " " and self._is_block(text.previous_sibling) and self._is_block(text.next_sibling):
+                # whitespace between block elements is not rendered
+                text.extract()
+            elif collapsed != text:
+                text.replace_with(collapsed)
+
+    @staticmethod
+    def split_css_rules(css: str) -> List[Tuple[str, str]]:
+        """
+        Splits stylesheet into list of (prelude, body) pairs, body of at-rules like @media is kept unparsed
+        """
+        rules = []
+        position = 0
+        while True:
+            start = css.find("{", position)
+            if start == -1:
+                break
+            prelude = css[position:start].strip()
+            if prelude.startswith("@") and ";" in prelude:
+                # statements like @import or @charset before the block
+                statement_end = position + css[position:start].find(";") + 1
+                rules.append((css[position:statement_end].strip(), None))
+                position = statement_end
+                continue
+            depth = 0
+            end = start
+            for end in range(start, len(css)):
+                if css[end] == "{":
+                    depth += 1
+                elif css[end] == "}":
+                    depth -= 1
+                    if depth == 0:
+                        break
+            rules.append((prelude, css[start + 1:end].strip()))
+            position = end + 1
+        return rules
+
+    @staticmethod
+    def is_selector_used(selector: str, tags: Set[str], classes: Set[str], ids: Set[str]) -> bool:
+        selector = _css_ignored_pattern.sub("", selector)
+        return all(class_ in classes for class_ in _css_class_pattern.findall(selector)) \
+            and all(id_ in ids for id_ in _css_id_pattern.findall(selector)) \
+            and all(tag.lower() in tags for tag in _css_tag_pattern.findall(_css_class_pattern.sub(
+                "", _css_id_pattern.sub("", selector))))
+
+    @staticmethod
+    def minify_declarations(body: str) -> str:
+        return _css_delimiter_pattern.sub(r"\1", _whitespace_pattern.sub(" ", body)).strip().rstrip(";")
+
+    def prune_css(self, css: str, tags: Set[str], classes: Set[str], ids: Set[str]) -> str:
+        result = []
+        for prelude, body in self.split_css_rules(_css_comment_pattern.sub("", css)):
+            prelude = _whitespace_pattern.sub(" ", prelude)
+            if body is None:
+                result.append(prelude)
+            elif prelude.startswith("@media") or prelude.startswith("@supports"):
+                inner = self.prune_css(body, tags, classes, ids)
+                if inner:
+                    result.append(prelude + "{" + inner + "}")
+            elif prelude.startswith("@"):
+                # @font-face, @page... are kept as they are
+                result.append(prelude + "{" + self.minify_declarations(body) + "}")
+            else:
+                selectors = [selector.strip() for selector in prelude.split(",")
+                             if self.is_selector_used(selector, tags, classes, ids)]
+                if selectors:
+                    result.append(",".join(selectors) + "{" + self.minify_declarations(body) + "}")
+        return "".join(result)
+
+    @staticmethod
+    def collect_used_selectors(issue_dir: str) -> Tuple[Set[str], Set[str], Set[str]]:
+        """
+        Returns sets of tag names, classes and ids used in rendered HTML files of the issue
+        """
+        tags, classes, ids = set(), set(), set()
+        for root, dirs, files in os.walk(issue_dir):
+            for filename in files:
+                if not filename.lower().endswith(".html"):
+                    continue
+                with open(os.path.join(root, filename), mode="r", encoding="utf-8-sig") as fr:
+                    html = BeautifulSoup(fr.read(), "html.parser")
+                for element in html.find_all(True):
+                    tags.add(element.name.lower())
+                    classes.update(element.get("class", []))
+                    if element.get("id") is not None:
+                        ids.add(element["id"])
+        return tags, classes, ids
+
+    def write_css(self, writer: IncrementalWriter, dest_dir: str, issue_dir: str) -> None:
+        """
+        Writes stylesheets from static folder to dest_dir, without rules unused by the rendered issue
+        """
+        tags, classes, ids = self.collect_used_selectors(issue_dir)
+        for filename in self.list_css_files(self.static_dir):
+            with open(os.path.join(self.static_dir, filename), mode="r", encoding="utf-8") as fr:
+                css = fr.read()
+            pruned = self.prune_css(css, tags, classes, ids)
+            self.report["css_bytes_before"] += len(css.encode("utf8"))
+            self.report["css_bytes_after"] += len(pruned.encode("utf8"))
+            writer.write_text(os.path.join(dest_dir, filename), pruned, encoding="utf-8")
+
+    def write_report(self, issue_dir: str, filename: str = "optimization.json") -> None:
+        report = dict(self.report)
+        report["bytes_saved"] = report["html_bytes_before"] - report["html_bytes_after"] \
+            + report["css_bytes_before"] - report["css_bytes_after"]
+        with open(os.path.join(issue_dir, filename), mode="w", encoding="utf-8") as fw:
+            json.dump(report, fw, indent=2, sort_keys=True)
+        log_info("optimization saved {saved} bytes (article HTML {html_before} -> {html_after} B, "
+                 "CSS {css_before} -> {css_after} B)".format(saved=report["bytes_saved"],
+                                                            html_before=report["html_bytes_before"],
+                                                            html_after=report["html_bytes_after"],
+                                                            css_before=report["css_bytes_before"],
+                                                            css_after=report["css_bytes_after"]))
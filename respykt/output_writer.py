@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+from hashlib import md5
+from secrets import token_hex
+from shutil import copy2 as copy_file, copymode
+from typing import Dict, Tuple
+
+from .utils import log_info
+
+# ioctl request number of FICLONE (linux/fs.h), used for reflinks on btrfs, xfs...
+_FICLONE = 0x40049409
+
+
+def create_temp_file(directory: str) -> Tuple[int, str]:
+    """
+    Creates temporary file in the directory, to be renamed over the output file once it is written
+
+    Unlike with `tempfile.mkstemp`, which makes files readable only by owner, permissions of the file are given
+    by umask like for any other new file.
+
+    :return: file descriptor open for writing and path of the file
+    """
+    while True:
+        temp_path = os.path.join(directory, ".{name}.tmp".format(name=token_hex(8)))
+        try:
+            fd = os.open(temp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY | getattr(os, "O_BINARY", 0), 0o666)
+        except FileExistsError:
+            continue
+        return fd, temp_path
+
+
+class IncrementalWriter:
+    """
+    Writes output files only when their content changed and links static files instead of copying them.
+
+    Every file handled during the run is recorded in the manifest together with its hash and the action
+    taken ('written', 'skipped', 'linked', 'reflinked' or 'copied').
+    """
+    manifest_file: str = None
+    base_dir: str = None
+    manifest: Dict[str, Dict[str, str]] = None
+
+    def __init__(self, base_dir: str, manifest_name: str = "manifest.json") -> None:
+        self.base_dir = base_dir
+        self.manifest_file = os.path.join(base_dir, manifest_name)
+        self.manifest = {}
+
+    @staticmethod
+    def hash_bytes(data: bytes) -> str:
+        return md5(data).hexdigest()
+
+    @staticmethod
+    def hash_file(filepath: str) -> str:
+        hash_source = md5()
+        with open(filepath, mode="rb") as fr:
+            for chunk in iter(lambda: fr.read(65536), b""):
+                hash_source.update(chunk)
+        return hash_source.hexdigest()
+
+    def _record(self, filepath: str, file_hash: str, action: str) -> None:
+        self.manifest[os.path.relpath(filepath, self.base_dir)] = {"hash": file_hash, "action": action}
+
+    def _is_unchanged(self, filepath: str, file_hash: str, size: int) -> bool:
+        if not os.path.isfile(filepath) or os.path.getsize(filepath) != size:
+            return False
+        # always compare with content on disk, the file may have been edited since the last run
+        return self.hash_file(filepath) == file_hash
+
+    def write_text(self, filepath: str, content: str, encoding: str = "utf-8-sig") -> bool:
+        """
+        Writes content to the file using temporary file and rename, unless the file already has the same content
+
+        :return: True if the file was written
+        """
+        data = content.encode(encoding)
+        file_hash = self.hash_bytes(data)
+        if self._is_unchanged(filepath, file_hash, len(data)):
+            self._record(filepath, file_hash, "skipped")
+            return False
+
+        file_dir = os.path.dirname(filepath) or "."
+        fd, temp_path = create_temp_file(file_dir)
+        try:
+            with os.fdopen(fd, mode="wb") as fw:
+                fw.write(data)
+            # rewritten file keeps its permissions
+            if os.path.exists(filepath):
+                copymode(filepath, temp_path)
+            os.replace(temp_path, filepath)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self._record(filepath, file_hash, "written")
+        return True
+
+    def link_file(self, source: str, dest: str) -> str:
+        """
+        Makes dest the same file as source - hardlink if possible, reflink or copy otherwise
+
+        :return: action taken
+        """
+        file_hash = self.hash_file(source)
+        if os.path.exists(dest) and os.path.samefile(source, dest):
+            self._record(dest, file_hash, "skipped")
+            return "skipped"
+        if self._is_unchanged(dest, file_hash, os.path.getsize(source)):
+            self._record(dest, file_hash, "skipped")
+            return "skipped"
+
+        temp_path = os.path.join(os.path.dirname(dest) or ".", "." + os.path.basename(dest) + ".tmp")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        try:
+            os.link(source, temp_path)
+            action = "linked"
+        except (OSError, AttributeError):
+            # different filesystem or hardlinks not supported
+            if self._reflink(source, temp_path):
+                action = "reflinked"
+            else:
+                copy_file(source, temp_path)
+                action = "copied"
+        os.replace(temp_path, dest)
+        self._record(dest, file_hash, action)
+        return action
+
+    @staticmethod
+    def _reflink(source: str, dest: str) -> bool:
+        try:
+            import fcntl
+        except ImportError:
+            # not available on Windows
+            return False
+        try:
+            with open(source, mode="rb") as fr, open(dest, mode="wb") as fw:
+                fcntl.ioctl(fw.fileno(), _FICLONE, fr.fileno())
+            return True
+        except OSError:
+            if os.path.exists(dest):
+                os.remove(dest)
+            return False
+
+    def save_manifest(self) -> None:
+        with open(self.manifest_file, mode="w", encoding="utf-8") as fw:
+            json.dump(self.manifest, fw, indent=2, sort_keys=True)
+        counts = {}
+        for record in self.manifest.values():
+            counts[record["action"]] = counts.get(record["action"], 0) + 1
+        log_info("manifest written to '{manifest}' ({counts})".format(
+            manifest=self.manifest_file,
+            counts=", ".join("{action}: {count}".format(action=a, count=c) for a, c in sorted(counts.items()))))
+        self.manifest = {}
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import cProfile
+import io
+import os
+import pstats
+import tracemalloc
+from contextlib import contextmanager
+from time import perf_counter
+from typing import List, Dict, Union
+
+from .utils import log_info
+
+
+class StageProfiler:
+    """
+    Collects cProfile statistics and tracemalloc top allocations for named pipeline stages.
+
+    When disabled, `stage` only yields, so wrapping the pipeline costs next to nothing.
+    """
+    enabled: bool = False
+    output_dir: str = None
+    top_allocations: int = None
+    stages: List[Dict[str, Union[str, float, int]]] = None
+
+    def __init__(self, output_dir: str = None, enabled: bool = False, top_allocations: int = 25) -> None:
+        if output_dir is None:
+            output_dir = "profile"
+        self.output_dir = output_dir
+        self.enabled = enabled
+        self.top_allocations = top_allocations
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name: str):
+        if not self.enabled:
+            yield
+            return
+
+        started_tracing = not tracemalloc.is_tracing()
+        baseline = None
+        if started_tracing:
+            tracemalloc.start()
+        else:
+            # tracing belongs to the caller, so its traces must stay - compare with baseline instead
+            baseline = tracemalloc.take_snapshot()
+        memory_start, _ = tracemalloc.get_traced_memory()
+        profile = cProfile.Profile()
+        time_start = perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            wall_time = perf_counter() - time_start
+            snapshot = tracemalloc.take_snapshot()
+            memory_end, peak_memory = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+                allocations = snapshot.statistics("lineno")
+            else:
+                # peak of the caller's tracing may come from before this stage, report growth instead
+                allocations = snapshot.compare_to(baseline, "lineno")
+                peak_memory = memory_end - memory_start
+            self.write_stage(name, profile, allocations, wall_time, peak_memory, exact_peak=started_tracing)
+
+    def write_stage(self, name: str, profile: cProfile.Profile, allocations: List,
+                    wall_time: float, peak_memory: int, exact_peak: bool = True) -> None:
+        if not os.path.isdir(self.output_dir):
+            os.makedirs(self.output_dir)
+        stats_file = os.path.join(self.output_dir, "{name}.prof".format(name=name))
+        report_file = os.path.join(self.output_dir, "{name}.txt".format(name=name))
+
+        # binary stats can be inspected later by pstats or snakeviz
+        profile.dump_stats(stats_file)
+
+        stats_stream = io.StringIO()
+        pstats.Stats(profile, stream=stats_stream).sort_stats("cumulative").print_stats(30)
+        with open(report_file, mode="w", encoding="utf-8") as fw:
+            fw.write("stage: {name}\n".format(name=name))
+            fw.write("wall time: {time:.3f} s\n".format(time=wall_time))
+            fw.write("{label}: {peak:.1f} KiB\n\n".format(
+                label="peak traced memory" if exact_peak else "traced memory growth", peak=peak_memory / 1024))
+            fw.write("top {count} allocations:\n".format(count=self.top_allocations))
+            for stat in allocations[:self.top_allocations]:
+                fw.write("  {stat}\n".format(stat=stat))
+            fw.write("\n")
+            fw.write(stats_stream.getvalue())
+
+        self.stages.append({"name": name, "wall_time": wall_time, "peak_memory": peak_memory})
+        log_info("profiled stage '{name}' ({time:.3f} s), report written "
+                 "to '{report}'".format(name=name, time=wall_time, report=report_file))
+
+    def write_summary(self) -> None:
+        if not self.enabled or not self.stages:
+            return
+        summary_file = os.path.join(self.output_dir, "summary.txt")
+        with open(summary_file, mode="w", encoding="utf-8") as fw:
+            for stage in self.stages:
+                fw.write("{name:<20} {time:>10.3f} s {peak:>12.1f} KiB\n".format(name=stage["name"],
+                                                                                time=stage["wall_time"],
+                                                                                peak=stage["peak_memory"] / 1024))
+        log_info("profiling summary written to '{summary}'".format(summary=summary_file))
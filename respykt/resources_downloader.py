@@ -3,7 +3,7 @@
 
 import os
 from time import sleep
-from typing import Optional, List
+from typing import Optional, List, Dict
 
 from requests import Session
 from requests import get as pure_get
@@ -21,6 +21,7 @@ class Resource:
 
 class ResourcesDownloader:
     resources: List[Resource] = None
+    filenames: Dict[str, str] = None
     data_directory: str = None
     session: Session = None
     wait_time: float = None
@@ -33,11 +34,15 @@ class ResourcesDownloader:
             os.mkdir(data_dir)
 
         self.resources = []
+        self.filenames = {}
         self.session = session
         # we don't want to overload the server...
         self.wait_time = wait_time
 
     def add_url(self, url: str, new_name: str = None) -> str:
+        if new_name is None and url in self.filenames:
+            # same resource was already added (e.g. by another account's article), download it only once
+            return self.filenames[url]
         if "." in url:
             extension = url[url.rfind(".") + 1:]
             if len(extension) > 6:
@@ -56,6 +61,7 @@ class ResourcesDownloader:
             if extension is not None:
                 new_name += "." + extension
         self.resources.append(Resource(url=url, filename=new_name))
+        self.filenames[url] = new_name
         return new_name
 
     def download_all(self) -> None:
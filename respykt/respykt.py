@@ -2,17 +2,22 @@
 # -*- coding: utf-8 -*-
 
 import configparser
+import json
 import os
 import re
 from hashlib import md5
-from shutil import copy2 as copy_file
-from typing import Dict, List, Union, Any
+from functools import lru_cache
+from typing import Dict, List, Union, Any, Callable, Iterable, Iterator, TextIO, Tuple, Optional
+from urllib.parse import urljoin
 
 from bs4 import BeautifulSoup
 from bs4.element import Tag
 from requests import Session
 
-from binding.template_engine import TemplateEngine
+from .binding.template_engine import TemplateEngine
+from .optimizer import OutputOptimizer
+from .output_writer import IncrementalWriter
+from .profiler import StageProfiler
 from .request_soap import RequestSoap
 from .resources_downloader import ResourcesDownloader
 from .utils import get_text, replace_figure_with_img, log_error, log_info
@@ -24,6 +29,11 @@ class Respykt:
     config_file: str = None
     session: Session = None
     dl_wait_time: float = None
+    profiling: bool = None
+    skip_locked: bool = True
+    optimize: bool = None
+    index_file: str = None
+    profile_top_allocations: int = None
     url: StringDict = None
     folder: StringDict = None
     issue: StringDict = None
@@ -32,13 +42,27 @@ class Respykt:
     requester: RequestSoap = None
     downloader: ResourcesDownloader = None
     templater: TemplateEngine = None
+    profiler: StageProfiler = None
+    writer: IncrementalWriter = None
+    optimizer: OutputOptimizer = None
 
     articles: List[StringDict] = None
     categories: List[StringDict] = None
 
-    _issue_url_pattern = re.compile(r"respekt\.cz/tydenik/([0-9]{4})/([0-9]+)")
+    _issue_url_pattern = re.compile(r"/tydenik/([0-9]{4})/([0-9]+)")
+    # element ending article content shown to readers without subscription
+    _paywall_class = "paywall"
+    _datestring_pattern = re.compile(
+        r"(\d{1,2})/(\d{4}), ?(\d{1,2})\. ?(\d{1,2})?\.? ?(\d{4})?[–-] ?(\d{1,2})\. ?(\d{1,2})\. ?(\d{4})")
 
-    def __init__(self, config_file: str = None):
+    def __init__(self, config_file: str = None, profiling: bool = None, issue_dir: str = None,
+                 home_url: str = None):
+        """
+        :param config_file: path to the config file
+        :param profiling: enable profiling of pipeline stages, overrides config file
+        :param issue_dir: output folder of the issue, overrides config file
+        :param home_url: URL of respekt.cz home page, e.g. of a local stand-in server, overrides config file
+        """
         self.session = Session()
         self.folder = {}
         self.issue = {}
@@ -49,13 +73,27 @@ class Respykt:
         self.config_file = config_file
         if config_file:
             self.load_conf_from_file(config_file)
+        # explicit argument overrides config file setting
+        if profiling is not None:
+            self.profiling = profiling
+        if issue_dir is not None:
+            self.folder["issue"] = issue_dir
+        if home_url is not None:
+            self.url["home"] = home_url
         self.load_conf_default()
+        if not os.path.isdir(self.folder["issue"]):
+            os.makedirs(self.folder["issue"])
 
         self.requester = RequestSoap(session=self.session)
         self.downloader = ResourcesDownloader(session=self.session, wait_time=self.dl_wait_time,
                                               data_dir=self.folder["issue_res"])
         self.templater = TemplateEngine(templates_dir=self.folder["templates"],
                                         module_dir=self.folder["mako_modules"])
+        self.profiler = StageProfiler(output_dir=self.folder["profile"], enabled=self.profiling,
+                                      top_allocations=self.profile_top_allocations)
+        self.writer = IncrementalWriter(base_dir=self.folder["issue"])
+        if self.optimize:
+            self.optimizer = OutputOptimizer(static_dir=self.folder["static"])
 
     def load_conf_from_file(self, config_file: str = None) -> None:
         if config_file is None:
@@ -85,11 +123,27 @@ class Respykt:
                 self.folder["mako_modules"] = config["FOLDERS"]["mako_modules"]
             if "static" in config["FOLDERS"]:
                 self.folder["static"] = config["FOLDERS"]["static"]
-        if "DONWLOAD" in config:
+            if "profile" in config["FOLDERS"]:
+                self.folder["profile"] = config["FOLDERS"]["profile"]
+        if "DOWNLOAD" in config:
             if "wait_time" in config["DOWNLOAD"]:
-                self.dl_wait_time = config["DOWNLOAD"]["wait_time"]
-        for folder in self.folder.values():
-            if not os.path.isdir(folder):
+                self.dl_wait_time = config["DOWNLOAD"].getfloat("wait_time")
+            if "home_url" in config["DOWNLOAD"]:
+                self.url["home"] = config["DOWNLOAD"]["home_url"]
+        if "PROFILING" in config:
+            if "enabled" in config["PROFILING"]:
+                self.profiling = config["PROFILING"].getboolean("enabled")
+            if "top_allocations" in config["PROFILING"]:
+                self.profile_top_allocations = config["PROFILING"].getint("top_allocations")
+        if "INDEX" in config:
+            if "file" in config["INDEX"]:
+                self.index_file = config["INDEX"]["file"]
+        if "OPTIMIZE" in config:
+            if "enabled" in config["OPTIMIZE"]:
+                self.optimize = config["OPTIMIZE"].getboolean("enabled")
+        for folder_name, folder in self.folder.items():
+            # profiling folder is created only when some stage is actually profiled
+            if folder_name != "profile" and not os.path.isdir(folder):
                 os.mkdir(folder)
 
     def load_conf_default(self) -> None:
@@ -106,8 +160,21 @@ class Respykt:
             self.folder["mako_modules"] = os.path.join("resources", "mako_modules")
         if "static" not in self.folder:
             self.folder["static"] = os.path.join("resources", "static")
+        if "profile" not in self.folder:
+            # profiling reports are stored next to the issue output
+            self.folder["profile"] = self.folder["issue"].rstrip("/\\") + "_profile"
         if self.dl_wait_time is None:
             self.dl_wait_time = 0.1
+        if not self.url["home"].endswith("/"):
+            self.url["home"] += "/"
+        if self.profiling is None:
+            self.profiling = False
+        if self.profile_top_allocations is None:
+            self.profile_top_allocations = 25
+        if self.optimize is None:
+            self.optimize = False
+        if self.index_file is None:
+            self.index_file = "issue_index.json"
 
     def login(self):
         if "username" in self.user and "password" in self.user:
@@ -119,7 +186,7 @@ class Respykt:
     def set_issue(self, year: Union[str, int], number: Union[str, int]):
         self.issue["year"] = str(year)
         self.issue["number"] = str(number)
-        self.url["issue"] = "https://www.respekt.cz/tydenik/{year}/{number}".format(year=year, number=number)
+        self.url["issue"] = "{home}tydenik/{year}/{number}".format(home=self.url["home"], year=year, number=number)
 
     def get_current_issue(self) -> str:
         log_info("issue not set, searching home page for current one")
@@ -129,20 +196,50 @@ class Respykt:
         issue_url_search = self._issue_url_pattern.search(issue_url)
         self.issue["year"] = issue_url_search.group(1)
         self.issue["number"] = issue_url_search.group(2)
-        self.url["issue"] = issue_url
-        return issue_url
+        self.url["issue"] = urljoin(self.url["home"], issue_url)
+        return self.url["issue"]
 
     @staticmethod
-    def get_date_from_datestring(datestring: str):
+    @lru_cache(maxsize=256)
+    def parse_datestring(datestring: str) -> Tuple[Optional[str], ...]:
         # 51/2002, 16.–23. 12. 2002
         # 9/2019, 25. 2. – 3. 3. 2019
         # 9/2019, 25. 2. – 3. 3. 2019
         # 1/2003, 23. 12. 2002–2. 1. 2003
-        datestring_format = re.compile(
-            r"(\d{1,2})/(\d{4}), ?(\d{1,2})\. ?(\d{1,2})?\.? ?(\d{4})?[–-] ?(\d{1,2})\. ?(\d{1,2})\. ?(\d{4})")
-        issue_datematch = datestring_format.search(datestring).groups()
-        return "{year}{month:02d}{day:02d}".format(year=issue_datematch[-1], month=int(issue_datematch[-2]),
-                                                   day=int(issue_datematch[2]))
+        return Respykt._datestring_pattern.search(datestring).groups()
+
+    @staticmethod
+    def get_date_from_datestring(datestring: str) -> str:
+        """
+        Returns first day of the issue, like '20190225'
+        """
+        date_from, _ = Respykt.get_date_range_from_datestring(datestring)
+        return date_from.replace("-", "")
+
+    @staticmethod
+    def get_date_range_from_datestring(datestring: str) -> Tuple[str, str]:
+        """
+        Returns first and last day of the issue in ISO format, like ('2019-02-25', '2019-03-03')
+        """
+        _, _, day_from, month_from, year_from, day_to, month_to, year_to = Respykt.parse_datestring(datestring)
+        month_from = int(month_from or month_to)
+        if year_from is None:
+            # issue spanning new year, like '30. 12. – 5. 1. 2020', starts in the previous year
+            year_from = int(year_to) - 1 if (month_from, int(day_from)) > (int(month_to), int(day_to)) else year_to
+        date_from = "{year}-{month:02d}-{day:02d}".format(year=year_from, month=month_from, day=int(day_from))
+        date_to = "{year}-{month:02d}-{day:02d}".format(year=year_to, month=int(month_to), day=int(day_to))
+        return date_from, date_to
+
+    def set_uid(self) -> None:
+        """
+        Computes unique identifier of the issue, which differs for every user
+        """
+        hash_source = md5()
+        hash_source.update("Respekt_".encode("utf8"))
+        hash_source.update(self.issue["date"].encode("utf8"))
+        hash_source.update(self.user["username"].encode("utf8") if "username" in self.user else "(free)".encode("utf8"))
+        self.issue["uid"] = hash_source.hexdigest()
+        self.issue["username"] = self.user["username"] if "username" in self.user else None
 
     def parse_toc_page(self):
         if "issue" not in self.url:
@@ -152,18 +249,14 @@ class Respykt:
 
         self.issue["title"] = get_text(toc_page.find(class_="heroissue").h2)
         self.issue["subtitle"] = get_text(toc_page.find(class_="heroissue").find("div", class_="heroissue-theme"))
-        cover_image = self.downloader.add_url(toc_page.find(class_="heroissue").a["href"])
+        cover_url = urljoin(self.url["issue"], toc_page.find(class_="heroissue").a["href"])
+        cover_image = self.downloader.add_url(cover_url)
         self.issue["cover"] = cover_image
 
         issue_datestring = get_text(toc_page.find(class_="heroissue").find("time", class_="heroissue-date"))
         self.issue["datestring"] = issue_datestring
         self.issue["date"] = self.get_date_from_datestring(issue_datestring)
-        hash_source = md5()
-        hash_source.update("Respekt_".encode("utf8"))
-        hash_source.update(self.issue["date"].encode("utf8"))
-        hash_source.update(self.user["username"].encode("utf8") if "username" in self.user else "(free)".encode("utf8"))
-        self.issue["uid"] = hash_source.hexdigest()
-        self.issue["username"] = self.user["username"] if "username" in self.user else None
+        self.set_uid()
 
         articles_raw = toc_page(class_="issuedetail-categorized-item")
         self.articles = []
@@ -172,9 +265,7 @@ class Respykt:
         categories_count = 0
 
         for art in articles_raw:
-            article = {"url": art["href"]}
-            if article["url"][:3] != "htt" and article["url"][0] == "/":
-                article["url"] = self.url["home"] + article["url"][1:]
+            article = {"url": urljoin(self.url["issue"], art["href"])}
             article["title"] = get_text(art.find(class_="issuedetail-categorized-title"))
             article["authors"] = get_text(art.find(class_="issuedetail-categorized-author"))
             article["perex"] = get_text(art.find(class_="issuedetail-categorized-perex"))
@@ -186,7 +277,7 @@ class Respykt:
                 # those are special cases, will deal with them later
                 # (each will require special template and 'anketa' ('survey') entirely different parsing)
                 continue
-            if article["is_locked"]:
+            if article["is_locked"] and self.skip_locked:
                 # hit paywal...
                 continue
 
@@ -208,60 +299,169 @@ class Respykt:
         self.issue["articles"] = self.articles
         self.issue["categories"] = self.categories
 
+    def number_articles(self) -> None:
+        """
+        Numbers categories from 1 and their articles as category id * 100 + order in category, like 101, 102...
+
+        Called again after articles are removed from the issue, so the numbering has no gaps.
+        """
+        for category_no, category in enumerate(self.categories, start=1):
+            category["id"] = category_no
+            for article_no, article in enumerate(category["articles"], start=1):
+                article["id"] = category_no * 100 + article_no
+
     def download_resources(self):
         log_info("downloading resources to folder '{issue_res}'".format(issue_res=self.folder["issue_res"]))
         self.downloader.download_all()
         log_info("  done")
 
-    def download_articles(self):
+    def download_articles(self, articles: List[StringDict] = None):
+        for _ in self.iter_articles(articles):
+            pass
+
+    def iter_articles(self, articles: List[StringDict] = None,
+                      release_content: bool = False) -> Iterator[StringDict]:
+        """
+        Downloads and parses articles one by one, yielding each of them as soon as it is ready
+
+        Next article is not downloaded until the consumer asks for it.
+
+        :param articles: articles to process, all articles of the issue by default
+        :param release_content: drop article content once the consumer is done with it, so memory usage
+            does not grow with the number of articles
+        """
         if self.articles is None:
             self.parse_toc_page()
+        if articles is None:
+            articles = self.articles
 
-        for art_no, article in enumerate(self.articles):
-            log_info("processing article {no}/{count}: '{title}'".format(no=art_no + 1, count=len(self.articles),
+        for art_no, article in enumerate(articles):
+            log_info("processing article {no}/{count}: '{title}'".format(no=art_no + 1, count=len(articles),
                                                                          title=article["title"]))
-            # download and parse article page
-            soap_article: BeautifulSoup = self.requester.get(article["url"])
-            article["topics"] = get_text(soap_article.find(class_="post-topics")("a"))
-            article["subtitle"] = get_text(soap_article.find("h2", class_="post-subtitle"))
-            article["date"] = get_text(soap_article.find(class_="authorship-note"))
-
-            # search for header image
-            article_header_image = soap_article.find("header", class_="post-header").find("figure", class_="frame")
-            if article_header_image is not None:
-                article["header_image_src"] = replace_figure_with_img(self.downloader, soap_article,
-                                                                      article_header_image,
-                                                                      return_src=True, max_width=800)
-            else:
-                article["header_image_src"] = None
-
-            article_content: Tag = soap_article.find(id="postcontent")
-            # replace all figures in article content with simple <img> tag
-            for article_figure in article_content("figure"):
-                replace_figure_with_img(self.downloader, soap_article, article_figure, max_width=500)
-            # kindlegen breaks on <blockquote> tags, so get rid of them
-            for quote in article_content(class_="quote"):
-                quote.extract()
+            self.download_article(article)
+            yield article
+            if release_content:
+                article.pop("content", None)
+
+    def export_ndjson(self, fw: TextIO, articles: List[StringDict] = None, release_content: bool = False) -> int:
+        """
+        Streams articles as newline delimited JSON, one article per line, as they are parsed
+
+        :param release_content: drop article content once it is exported to keep memory usage constant,
+            articles can't be rendered by `write_files` afterwards
+        :return: number of exported articles
+        """
+        if self.articles is None:
+            self.parse_toc_page()
+        count = 0
+        issue_info = {key: self.issue.get(key) for key in ("year", "number", "title", "date", "uid")}
+        for article in self.iter_articles(articles, release_content=release_content):
+            record = {key: value for key, value in article.items() if key != "filepath"}
+            record["issue"] = issue_info
+            fw.write(json.dumps(record, ensure_ascii=False))
+            fw.write("\n")
+            fw.flush()
+            count += 1
+        return count
+
+    def is_paywalled(self, article_content: Tag) -> bool:
+        """
+        Checks if the article page shows only the beginning of locked article (user is not entitled to read it)
+        """
+        # lock badges elsewhere on the page are shown to subscribers too, only the content tells
+        return article_content.find(class_=self._paywall_class) is not None
+
+    def download_article(self, article: StringDict):
+        # download and parse article page
+        soap_article: BeautifulSoup = self.requester.get(article["url"])
+        article["topics"] = get_text(soap_article.find(class_="post-topics")("a"))
+        article["subtitle"] = get_text(soap_article.find("h2", class_="post-subtitle"))
+        article["date"] = get_text(soap_article.find(class_="authorship-note"))
+
+        # search for header image
+        article_header_image = soap_article.find("header", class_="post-header").find("figure", class_="frame")
+        if article_header_image is not None:
+            article["header_image_src"] = replace_figure_with_img(self.downloader, soap_article,
+                                                                  article_header_image,
+                                                                  return_src=True, max_width=800,
+                                                                  base_url=article["url"])
+        else:
+            article["header_image_src"] = None
+
+        article_content: Tag = soap_article.find(id="postcontent")
+        article["is_paywalled"] = self.is_paywalled(article_content)
+        # replace all figures in article content with simple <img> tag
+        for article_figure in article_content("figure"):
+            replace_figure_with_img(self.downloader, soap_article, article_figure, max_width=500,
+                                    base_url=article["url"])
+        # kindlegen breaks on <blockquote> tags, so get rid of them
+        for quote in article_content(class_="quote"):
+            quote.extract()
+        if self.optimizer is not None:
+            article["content"] = self.optimizer.optimize_article(article_content)
+        else:
             article["content"] = str(article_content)
 
-    def run(self):
-        self.login()
-        self.parse_toc_page()
-        self.download_articles()
-        self.write_files()
-        self.download_resources()
-        self.copy_static_res()
+    def run(self, stream: bool = False, on_stage: Callable[[str], None] = None,
+            article_wrapper: Callable[[Iterator[StringDict]], Iterator[StringDict]] = None):
+        """
+        :param stream: render every article right after it is downloaded, without keeping its content in memory
+        :param on_stage: called with name of every stage before it starts, e.g. to report progress
+        :param article_wrapper: wraps iterator of downloaded articles, e.g. to count them
+        """
+        self.profiler.stages = []
+        with self.run_stage("login", on_stage):
+            self.login()
+        with self.run_stage("parse_toc_page", on_stage):
+            self.parse_toc_page()
+        articles = self.iter_articles(release_content=stream)
+        if article_wrapper is not None:
+            articles = article_wrapper(articles)
+        if stream:
+            with self.run_stage("download_and_write_files", on_stage):
+                self.write_files(articles)
+        else:
+            with self.run_stage("download_articles", on_stage):
+                for _ in articles:
+                    pass
+            with self.run_stage("write_files", on_stage):
+                self.write_files()
+        with self.run_stage("download_resources", on_stage):
+            self.download_resources()
+        with self.run_stage("copy_static_res", on_stage):
+            self.copy_static_res()
+        self.writer.save_manifest()
+        if self.optimizer is not None:
+            self.optimizer.write_report(self.folder["issue"])
+        self.profiler.write_summary()
+
+    def run_stage(self, name: str, on_stage: Callable[[str], None] = None):
+        if on_stage is not None:
+            on_stage(name)
+        return self.profiler.stage(name)
 
     def copy_static_res(self):
         source_dir = self.folder["static"]
         dest_dir = self.folder["issue_res"]
-        log_info("copying content of directory '{source}' "
+        log_info("linking content of directory '{source}' "
                  "to resource dir '{dest}'".format(source=source_dir, dest=dest_dir))
         for filename in os.listdir(source_dir):
-            log_info("  '{filename}'".format(filename=filename))
-            copy_file(os.path.join(source_dir, filename), os.path.join(dest_dir, filename))
+            if self.optimizer is not None and filename.lower().endswith(".css"):
+                # stylesheets are pruned to rules used by the rendered issue instead
+                continue
+            action = self.writer.link_file(os.path.join(source_dir, filename), os.path.join(dest_dir, filename))
+            log_info("  '{filename}' ({action})".format(filename=filename, action=action))
+        if self.optimizer is not None:
+            log_info("writing stylesheets without unused rules")
+            self.optimizer.write_css(self.writer, dest_dir=dest_dir, issue_dir=self.folder["issue"])
 
-    def write_files(self):
+    def write_files(self, articles: Iterable[StringDict] = None):
+        """
+        Renders article pages and issue files (title, TOC, NCX, OPF)
+
+        :param articles: articles to render, can be a generator like `iter_articles()` to render each article
+            as soon as it is downloaded, all articles of the issue by default
+        """
         # prepare folder for article files
         article_filename_format = "article_{no:04d}.html"
         folder_articles = os.path.join(self.folder["issue"], "text")
@@ -270,14 +470,19 @@ class Respykt:
 
         self.issue["date"] = self.get_date_from_datestring(self.issue["datestring"])
 
-        # list of files to render using templates
-        files_to_render: List[Dict] = []
-
-        # add articles to list
-        for art_no, article in enumerate(self.articles):
+        # filenames are needed by TOC and OPF even for articles not rendered now
+        for article in self.articles:
             article["filename"] = article_filename_format.format(no=article["id"])
             article["filepath"] = os.path.join(folder_articles, article["filename"])
-            files_to_render.append({"filename": article["filepath"], "template": "article.html", "data": article})
+
+        # render articles
+        if articles is None:
+            articles = self.articles
+        for article in articles:
+            self.render_file(article["filepath"], "article.html", article)
+
+        # list of files to render using templates
+        files_to_render: List[Dict] = []
 
         # add TOC page at the end of first category
         pass
@@ -297,8 +502,10 @@ class Respykt:
 
         # render files
         for file_ in files_to_render:
-            with open(file_["filename"], mode="w", encoding="utf-8-sig") as fw:
-                log_info("using template '{tname}' to generate "
-                         "file '{filepath}'".format(tname=file_["template"], filepath=file_["filename"]))
-                raw_data = self.templater.serve_template(template_name=file_["template"], **file_["data"])
-                fw.write(raw_data)
+            self.render_file(file_["filename"], file_["template"], file_["data"])
+
+    def render_file(self, filepath: str, template: str, data: StringDict) -> None:
+        log_info("using template '{tname}' to generate file '{filepath}'".format(tname=template, filepath=filepath))
+        raw_data = self.templater.serve_template(template_name=template, **data)
+        if not self.writer.write_text(filepath, raw_data):
+            log_info("  unchanged, skipped")
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 from typing import Optional, Union, List
+from urllib.parse import urljoin
 
 from bs4 import BeautifulSoup
 from bs4.element import Tag, ResultSet
@@ -72,7 +73,8 @@ def get_text(tag: Union[Tag, ResultSet]) -> Union[str, List[str]]:
 
 
 def replace_figure_with_img(res_dl: ResourcesDownloader, parent: BeautifulSoup, figure: Tag, max_width=1024,
-                            image_folder: str = "../resources", return_src: bool = False) -> Optional[Union[Tag, str]]:
+                            image_folder: str = "../resources", return_src: bool = False,
+                            base_url: str = None) -> Optional[Union[Tag, str]]:
     # get source data from either 'srcset' or 'src' tags
     try:
         srcset: str = figure.img["srcset"]
@@ -102,6 +104,9 @@ def replace_figure_with_img(res_dl: ResourcesDownloader, parent: BeautifulSoup,
         except KeyError as e_key:
             log_error("Warning - replace_figure_with_img: cannot find title text for image: {e}".format(e=str(e_key)))
             alt_text = None
+    if base_url is not None:
+        # relative sources are resolved against the page the figure comes from
+        src = urljoin(base_url, src)
     new_src = image_folder + "/" + res_dl.add_url(src)
     img = parent.new_tag("img", src=new_src, alt=alt_text)
     # BeautifulSoup function for tag replacement
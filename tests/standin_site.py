@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from typing import Dict, Tuple
+from urllib.parse import parse_qs
+
+HOME_PAGE = """<html><body>
+<div class="currentissue"><a href="/tydenik/{year}/9">Aktuální číslo</a></div>
+</body></html>"""
+
+ISSUE_PAGE = """<html><body>
+<div class="heroissue">
+    <a href="/img/cover_{number}.jpg">obálka</a>
+    <h2>Číslo {number}</h2>
+    <div class="heroissue-theme">Téma čísla {number}</div>
+    <time class="heroissue-date">{number}/{year}, 18. 2. – 24. 2. {year}</time>
+</div>
+<div class="issuedetail-categorized">
+{sections}
+</div>
+</body></html>"""
+
+YEAR_PAGE = """<html><body>
+<div class="issues">
+{links}
+</div>
+</body></html>"""
+
+YEAR_ITEM = """    <a href="/tydenik/{year}/{number}">Číslo {number}</a>
+    <a href="/tydenik/{year}/{number}/uvodnik">Úvodník</a>"""
+
+SECTION_NAME = """    <div class="issuedetail-categorized-sectionname">{section}</div>"""
+
+ISSUE_ITEM = """    <a class="issuedetail-categorized-item" href="/tydenik/{year}/{number}/{name}">
+        <div class="issuedetail-categorized-title">Článek &amp; {name}</div>
+        <div class="issuedetail-categorized-author">Autor</div>
+        <div class="issuedetail-categorized-perex">Perex</div>{lock}
+    </a>"""
+
+LOCK_ICON = """
+        <span class="lock"></span>"""
+
+ARTICLE_PAGE = """<html><body>
+<header class="post-header">{badge}
+    <figure class="frame"><img srcset="/img/header_{number}.jpg 640w, /img/header_{number}_big.jpg 2048w"/></figure>
+</header>
+<div class="post-topics"><a>Česko</a><a>Politika</a></div>
+<h2 class="post-subtitle">Podtitulek</h2>
+<div class="authorship-note">18. 2. {year}</div>
+<div id="postcontent">
+    <p>Text článku {name}.</p>
+    {rest}
+</div>
+</body></html>"""
+
+ARTICLE_REST = """<figure><img src="img/{name}.jpg"/><figcaption>Popisek</figcaption></figure>"""
+
+# shown to everybody, subscribers too
+LOCK_BADGE = """
+    <span class="post-badge lock">Předplatné</span>"""
+
+PAYWALL = """<div class="paywall">Dočtěte s předplatným</div>"""
+
+# sections of issues, with (article name, is locked) pairs
+ISSUES = {
+    "8": {"Politika": (("prvni", False), ("druhy", False))},
+    "9": {"Politika": (("prvni", False), ("druhy", False))},
+    "10": {"Politika": (("zamceny", True),), "Kultura": (("prvni", False), ("druhy", True))},
+}
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    """
+    Serves minimal copy of respekt.cz pages, with relative links like the real site
+    """
+    server: "StandinSite"
+
+    def do_GET(self) -> None:
+        self.server.count_hit(self.path)
+        parts = self.path.strip("/").split("/")
+        issue_path = len(parts) > 1 and parts[0] == "tydenik" and parts[1] == self.server.year
+        if self.path == "/":
+            self.send_page(HOME_PAGE.format(year=self.server.year).encode("utf8"), "text/html; charset=utf-8")
+        elif parts[0] == "img" or (len(parts) == 5 and parts[3] == "img"):
+            self.send_page(b"image " + self.path.encode("utf8"), "image/jpeg")
+        elif len(parts) == 2 and issue_path:
+            self.send_page(self.render_year().encode("utf8"), "text/html; charset=utf-8")
+        elif len(parts) == 3 and issue_path and parts[2] in self.server.issues:
+            self.server.gate.wait()
+            self.send_page(self.render_issue(parts[2]).encode("utf8"), "text/html; charset=utf-8")
+        elif len(parts) == 4 and issue_path and parts[3] in self.server.get_articles(parts[2]):
+            self.send_page(self.render_article(parts[2], parts[3]).encode("utf8"), "text/html; charset=utf-8")
+        else:
+            self.send_page(b"<html><body>Not found</body></html>", "text/html", code=404)
+
+    def do_POST(self) -> None:
+        # login form, only subscribers get the cookie unlocking locked articles
+        form = parse_qs(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf8"))
+        cookie = None
+        if form.get("username", [""])[0] in self.server.subscribers:
+            cookie = "subscriber=1; Path=/"
+        self.send_page(HOME_PAGE.format(year=self.server.year).encode("utf8"), "text/html; charset=utf-8",
+                       cookie=cookie)
+
+    def render_year(self) -> str:
+        links = [YEAR_ITEM.format(year=self.server.year, number=number) for number in self.server.issues]
+        return YEAR_PAGE.format(links="\n".join(links))
+
+    def render_issue(self, number: str) -> str:
+        sections = []
+        for section, articles in self.server.issues[number].items():
+            sections.append(SECTION_NAME.format(section=section))
+            for name, locked in articles:
+                sections.append(ISSUE_ITEM.format(year=self.server.year, number=number, name=name,
+                                                  lock=LOCK_ICON if locked else ""))
+        return ISSUE_PAGE.format(year=self.server.year, number=number, sections="\n".join(sections))
+
+    def render_article(self, number: str, name: str) -> str:
+        locked = self.server.get_articles(number)[name]
+        rest = ARTICLE_REST.format(name=name)
+        if locked and "subscriber=1" not in self.headers.get("Cookie", ""):
+            rest = PAYWALL
+        return ARTICLE_PAGE.format(year=self.server.year, number=number, name=name, rest=rest,
+                                   badge=LOCK_BADGE if locked else "")
+
+    def send_page(self, body: bytes, content_type: str, code: int = 200, cookie: str = None) -> None:
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        if cookie is not None:
+            self.send_header("Set-Cookie", cookie)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format_: str, *args) -> None:
+        pass
+
+
+class StandinSite(ThreadingMixIn, HTTPServer):
+    """
+    Local stand-in for respekt.cz, counting requests of every path
+
+    All issues belong to the `year`. Issue pages are served only when `gate` is set, so tests can hold builds
+    in progress. Locked articles are shown whole only to users logged in with username from `subscribers`.
+    """
+    daemon_threads = True
+    year: str = None
+    issues: Dict[str, Dict[str, Tuple[Tuple[str, bool], ...]]] = None
+    subscribers: Tuple[str, ...] = None
+    hits: Dict[str, int] = None
+    gate: threading.Event = None
+
+    def __init__(self, issues: Dict[str, Dict[str, Tuple[Tuple[str, bool], ...]]] = None,
+                 subscribers: Tuple[str, ...] = ("predplatitel",), year: str = "2019") -> None:
+        super().__init__(("127.0.0.1", 0), StandinHandler)
+        self.year = year
+        self.issues = issues if issues is not None else ISSUES
+        self.subscribers = subscribers
+        self.hits = {}
+        self.hits_lock = threading.Lock()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    @property
+    def home_url(self) -> str:
+        return "http://127.0.0.1:{port}/".format(port=self.server_port)
+
+    def get_articles(self, number: str) -> Dict[str, bool]:
+        return {name: locked for articles in self.issues.get(number, {}).values() for name, locked in articles}
+
+    def count_hit(self, path: str) -> None:
+        with self.hits_lock:
+            self.hits[path] = self.hits.get(path, 0) + 1
+
+    def start(self) -> "StandinSite":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import tempfile
+import threading
+import unittest
+import xml.etree.ElementTree as ElementTree
+import zipfile
+from shutil import rmtree
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+from respykt.build_service import BuildServer, BuildService
+from tests.standin_site import StandinSite
+
+RESOURCES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "resources")
+
+
+class BuildServiceTest(unittest.TestCase):
+    """
+    Builds issues from local stand-in of respekt.cz through the HTTP build service
+    """
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+        self.site = StandinSite().start()
+        self.config_file = os.path.join(self.temp_dir, "config.ini")
+        with open(self.config_file, mode="w", encoding="utf-8") as fw:
+            fw.write("[FOLDERS]\n"
+                     "static = {static}\n"
+                     "templates = {templates}\n"
+                     "mako_modules = {modules}\n"
+                     "[DOWNLOAD]\n"
+                     "wait_time = 0\n".format(static=os.path.join(RESOURCES_DIR, "static"),
+                                              templates=os.path.join(RESOURCES_DIR, "templates"),
+                                              modules=os.path.join(self.temp_dir, "mako_modules")))
+        self.cache_dir = os.path.join(self.temp_dir, "builds")
+        self.servers = []
+
+    def tearDown(self) -> None:
+        self.site.gate.set()
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        self.site.shutdown()
+        self.site.server_close()
+        rmtree(self.temp_dir, ignore_errors=True)
+
+    def start_service(self, max_cached: int = 8) -> BuildServer:
+        service = BuildService(config_file=self.config_file, cache_dir=self.cache_dir, max_cached=max_cached,
+                               home_url=self.site.home_url)
+        server = BuildServer(("127.0.0.1", 0), service, wait_timeout=30)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.servers.append(server)
+        return server
+
+    @staticmethod
+    def fetch(server: BuildServer, path: str):
+        with urlopen("http://127.0.0.1:{port}{path}".format(port=server.server_port, path=path), timeout=60) as r:
+            return r.status, r.read()
+
+    def test_concurrent_requests_are_coalesced(self) -> None:
+        server = self.start_service()
+        self.site.gate.clear()
+        results = []
+        requests = [threading.Thread(target=lambda: results.append(self.fetch(server, "/issues/2019/9/epub?wait=1")))
+                    for _ in range(4)]
+        for request in requests:
+            request.start()
+        # let all requests reach the service before the issue page is served
+        while len(server.service.builds) == 0:
+            threading.Event().wait(0.01)
+        threading.Event().wait(0.2)
+        self.site.gate.set()
+        for request in requests:
+            request.join(timeout=60)
+
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(status == 200 for status, _ in results))
+        self.assertEqual(self.site.hits["/tydenik/2019/9"], 1)
+        self.assertEqual(self.site.hits["/tydenik/2019/9/prvni"], 1)
+        # relative links of the stand-in are resolved against their pages
+        self.assertEqual(self.site.hits["/img/cover_9.jpg"], 1)
+        self.assertEqual(self.site.hits["/tydenik/2019/9/img/prvni.jpg"], 1)
+
+        epub_file = os.path.join(self.cache_dir, "respekt_2019_9.epub")
+        with zipfile.ZipFile(epub_file) as epub:
+            self.assertEqual(epub.namelist()[0], "mimetype")
+            self.assertIn("content.opf", epub.namelist())
+            # every document must be well-formed XML, also for parsers which don't load DTD
+            for name in epub.namelist():
+                if os.path.splitext(name)[1] in (".html", ".opf", ".ncx", ".xml"):
+                    ElementTree.fromstring(epub.read(name))
+
+    def test_finished_build_is_cached(self) -> None:
+        server = self.start_service()
+        status, first = self.fetch(server, "/issues/2019/9/epub?wait=1")
+        self.assertEqual(status, 200)
+        status, second = self.fetch(server, "/issues/2019/9/epub?wait=1")
+        self.assertEqual(status, 200)
+        self.assertEqual(first, second)
+        self.assertEqual(self.site.hits["/tydenik/2019/9"], 1)
+
+    def test_least_recently_used_build_is_evicted(self) -> None:
+        server = self.start_service(max_cached=1)
+        self.assertEqual(self.fetch(server, "/issues/2019/8/epub?wait=1")[0], 200)
+        self.assertTrue(os.path.isfile(os.path.join(self.cache_dir, "respekt_2019_8.epub")))
+        self.assertEqual(self.fetch(server, "/issues/2019/9/epub?wait=1")[0], 200)
+
+        self.assertEqual(list(server.service.builds), [("2019", "9")])
+        self.assertFalse(os.path.exists(os.path.join(self.cache_dir, "respekt_2019_8.epub")))
+        self.assertFalse(os.path.exists(os.path.join(self.cache_dir, "2019_8")))
+        self.assertTrue(os.path.isfile(os.path.join(self.cache_dir, "respekt_2019_9.epub")))
+
+    def test_builds_finishing_together_are_served(self) -> None:
+        server = self.start_service(max_cached=1)
+        self.site.gate.clear()
+        results = {}
+
+        def fetch_issue(number: str) -> None:
+            results[number] = self.fetch(server, "/issues/2019/{number}/epub?wait=1".format(number=number))
+
+        requests = [threading.Thread(target=fetch_issue, args=(number,)) for number in ("8", "9")]
+        for request in requests:
+            request.start()
+        while len(server.service.builds) < 2:
+            threading.Event().wait(0.01)
+        self.site.gate.set()
+        for request in requests:
+            request.join(timeout=60)
+
+        # none of the builds is evicted while its request is waiting for it
+        self.assertEqual(results["8"][0], 200)
+        self.assertEqual(results["9"][0], 200)
+        self.assertTrue(results["8"][1].startswith(b"PK"))
+        self.assertTrue(results["9"][1].startswith(b"PK"))
+        # the cache shrinks back once the requests are done
+        for _ in range(100):
+            if len(server.service.builds) == 1:
+                break
+            threading.Event().wait(0.05)
+        self.assertEqual(len(server.service.builds), 1)
+
+    def test_missing_file_is_not_found(self) -> None:
+        server = self.start_service()
+        self.assertEqual(self.fetch(server, "/issues/2019/9/epub?wait=1")[0], 200)
+        os.remove(os.path.join(self.cache_dir, "respekt_2019_9.epub"))
+        with self.assertRaises(HTTPError) as error:
+            self.fetch(server, "/issues/2019/9/epub")
+        self.assertEqual(error.exception.code, 404)
+
+    def test_build_runs_whole_pipeline_with_profiling(self) -> None:
+        with open(self.config_file, mode="a", encoding="utf-8") as fw:
+            fw.write("[PROFILING]\nenabled = yes\n")
+        server = self.start_service(max_cached=1)
+        self.assertEqual(self.fetch(server, "/issues/2019/9/epub?wait=1")[0], 200)
+        status = json.loads(self.fetch(server, "/issues/2019/9")[1].decode("utf8"))
+        self.assertEqual((status["articles_done"], status["articles_total"]), (2, 2))
+
+        profile_dir = os.path.join(self.cache_dir, "2019_9_profile")
+        with open(os.path.join(profile_dir, "summary.txt"), mode="r", encoding="utf-8") as fr:
+            stages = [line.split()[0] for line in fr]
+        self.assertEqual(stages, ["login", "parse_toc_page", "download_and_write_files", "download_resources",
+                                  "copy_static_res"])
+        self.assertTrue(os.path.isfile(os.path.join(self.cache_dir, "2019_9", "manifest.json")))
+
+        # profiling reports go away with the build
+        self.assertEqual(self.fetch(server, "/issues/2019/8/epub?wait=1")[0], 200)
+        self.assertFalse(os.path.exists(profile_dir))
+
+    def test_failed_build_is_not_cached(self) -> None:
+        server = self.start_service(max_cached=1)
+        self.assertEqual(self.fetch(server, "/issues/2019/9/epub?wait=1")[0], 200)
+        with self.assertRaises(HTTPError) as error:
+            self.fetch(server, "/issues/2019/7/epub?wait=1")
+        self.assertEqual(error.exception.code, 500)
+
+        # failed build neither takes place of the cached one, nor stays on disk
+        self.assertEqual(list(server.service.builds), [("2019", "9")])
+        self.assertTrue(os.path.isfile(os.path.join(self.cache_dir, "respekt_2019_9.epub")))
+        self.assertFalse(os.path.exists(os.path.join(self.cache_dir, "2019_7")))
+
+    def test_cached_builds_are_reused_after_restart(self) -> None:
+        server = self.start_service()
+        self.assertEqual(self.fetch(server, "/issues/2019/8/epub?wait=1")[0], 200)
+        self.assertEqual(self.fetch(server, "/issues/2019/9/epub?wait=1")[0], 200)
+        # folder of a build interrupted by the restart
+        os.mkdir(os.path.join(self.cache_dir, "2019_10"))
+
+        restarted = self.start_service(max_cached=1)
+        self.assertEqual(list(restarted.service.builds), [("2019", "9")])
+        self.assertFalse(os.path.exists(os.path.join(self.cache_dir, "respekt_2019_8.epub")))
+        self.assertFalse(os.path.exists(os.path.join(self.cache_dir, "2019_10")))
+        self.assertEqual(self.fetch(restarted, "/issues/2019/9/epub?wait=1")[0], 200)
+        self.assertEqual(self.site.hits["/tydenik/2019/9"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import stat
+import tempfile
+import unittest
+from datetime import date
+from shutil import rmtree
+
+from respykt.issue_index import IssueIndex
+from tests.standin_site import ISSUES, StandinSite
+
+
+class IssueIndexTest(unittest.TestCase):
+    """
+    Crawls year listings of the stand-in site
+    """
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+        self.index_file = os.path.join(self.temp_dir, "issue_index.json")
+        self.umask = os.umask(0o022)
+        self.sites = []
+
+    def tearDown(self) -> None:
+        os.umask(self.umask)
+        for site in self.sites:
+            site.shutdown()
+            site.server_close()
+        rmtree(self.temp_dir, ignore_errors=True)
+
+    def start_site(self, year: str) -> StandinSite:
+        site = StandinSite(issues={"8": ISSUES["8"], "9": ISSUES["9"]}, year=year).start()
+        self.sites.append(site)
+        return site
+
+    def test_complete_past_year_is_not_crawled_again(self) -> None:
+        site = self.start_site("2019")
+        index = IssueIndex(index_file=self.index_file, home_url=site.home_url)
+        self.assertEqual(index.crawl(first_year=2019, last_year=2019), 2)
+        self.assertTrue(index.years["2019"]["complete"])
+        self.assertEqual(index.crawl(first_year=2019, last_year=2019), 0)
+        self.assertEqual(site.hits["/tydenik/2019"], 1)
+        self.assertEqual(site.hits["/tydenik/2019/9"], 1)
+
+        # index is read back from the file, which gets usual permissions
+        loaded = IssueIndex(index_file=self.index_file, home_url=site.home_url)
+        self.assertEqual(loaded.get(2019, 9)["date_from"], "2019-02-18")
+        self.assertEqual(loaded.get(2019, 9)["articles_count"], 2)
+        self.assertEqual(stat.S_IMODE(os.stat(self.index_file).st_mode), 0o644)
+
+    def test_refresh_downloads_only_missing_issues(self) -> None:
+        year = str(date.today().year)
+        site = self.start_site(year)
+        index = IssueIndex(index_file=self.index_file, home_url=site.home_url)
+        self.assertEqual(index.refresh(), 2)
+        self.assertFalse(index.years[year]["complete"])
+
+        site.issues["10"] = ISSUES["10"]
+        self.assertEqual(index.refresh(), 1)
+        self.assertEqual(site.hits["/tydenik/{year}".format(year=year)], 2)
+        for number in ("8", "9", "10"):
+            self.assertEqual(site.hits["/tydenik/{year}/{number}".format(year=year, number=number)], 1)
+        self.assertEqual(sorted(issue["number"] for issue in index.issues()), ["10", "8", "9"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import unittest
+import xml.etree.ElementTree as ElementTree
+from shutil import rmtree
+
+from respykt.multi_account import MultiRespykt
+from tests.standin_site import StandinSite
+
+RESOURCES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "resources")
+
+
+class MultiRespyktTest(unittest.TestCase):
+    """
+    Builds issue 10 of the stand-in site, with locked first article, for subscriber and for account without
+    subscription
+    """
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+        self.site = StandinSite().start()
+        self.config_file = os.path.join(self.temp_dir, "config.ini")
+        with open(self.config_file, mode="w", encoding="utf-8") as fw:
+            fw.write("[LOGIN]\n"
+                     "username = predplatitel\n"
+                     "password = heslo\n"
+                     "[LOGIN:ctenar]\n"
+                     "username = ctenar\n"
+                     "password = heslo\n"
+                     "[FOLDERS]\n"
+                     "issue = {issue}\n"
+                     "static = {static}\n"
+                     "templates = {templates}\n"
+                     "mako_modules = {modules}\n"
+                     "[DOWNLOAD]\n"
+                     "wait_time = 0\n"
+                     "home_url = {home}\n".format(issue=os.path.join(self.temp_dir, "issue"),
+                                                  static=os.path.join(RESOURCES_DIR, "static"),
+                                                  templates=os.path.join(RESOURCES_DIR, "templates"),
+                                                  modules=os.path.join(self.temp_dir, "mako_modules"),
+                                                  home=self.site.home_url))
+        self.multi = MultiRespykt(self.config_file)
+        self.multi.set_issue(2019, 10)
+        self.multi.run()
+
+    def tearDown(self) -> None:
+        self.site.shutdown()
+        self.site.server_close()
+        rmtree(self.temp_dir, ignore_errors=True)
+
+    def get_edition_folder(self, username: str) -> str:
+        return os.path.join(self.temp_dir, "issue", username)
+
+    def get_links(self, username: str):
+        folder = self.get_edition_folder(username)
+        ncx = ElementTree.parse(os.path.join(folder, "toc.ncx")).getroot()
+        opf = ElementTree.parse(os.path.join(folder, "respekt.opf")).getroot()
+        links = [content.get("src") for content in ncx.iter("{http://www.daisy.org/z3986/2005/ncx/}content")]
+        links += [reference.get("href") for reference in opf.iter("{http://www.idpf.org/2007/opf}reference")]
+        return links
+
+    def test_subscriber_gets_locked_articles(self) -> None:
+        self.assertEqual(sorted(os.listdir(os.path.join(self.get_edition_folder("predplatitel"), "text"))),
+                         ["article_0101.html", "article_0201.html", "article_0202.html"])
+        with open(os.path.join(self.get_edition_folder("predplatitel"), "text", "article_0101.html"),
+                  encoding="utf-8-sig") as fr:
+            self.assertIn("img", fr.read())
+
+    def test_locked_articles_are_left_out_without_subscription(self) -> None:
+        folder = self.get_edition_folder("ctenar")
+        self.assertEqual(sorted(os.listdir(os.path.join(folder, "text"))), ["article_0101.html"])
+        with open(os.path.join(folder, "text", "article_0101.html"), encoding="utf-8-sig") as fr:
+            self.assertIn("prvni", fr.read())
+        # account without subscription stops after the first locked article
+        self.assertEqual(self.site.hits["/tydenik/2019/10/zamceny"], 2)
+        self.assertEqual(self.site.hits["/tydenik/2019/10/druhy"], 1)
+
+    def test_toc_and_opf_link_existing_articles(self) -> None:
+        for username in ("predplatitel", "ctenar"):
+            folder = self.get_edition_folder(username)
+            for link in self.get_links(username):
+                self.assertTrue(os.path.isfile(os.path.join(folder, link)), "{0}: {1}".format(username, link))
+
+
+if __name__ == "__main__":
+    unittest.main()
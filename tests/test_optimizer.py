@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from bs4 import BeautifulSoup
+
+from respykt.optimizer import OutputOptimizer
+
+
+class OutputOptimizerTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # no stylesheets, so only classes and ids needed by the article itself are kept
+        self.optimizer = OutputOptimizer(static_dir="")
+
+    def optimize(self, html: str) -> str:
+        return self.optimizer.optimize_article(BeautifulSoup(html, "html.parser").div)
+
+    def test_whitespace_only_inline_element_keeps_words_apart(self) -> None:
+        self.assertEqual(self.optimize("<div><p>Hello<span> </span>world</p></div>"), "<div><p>Hello world</p></div>")
+        self.assertEqual(self.optimize("<div><p>Hello<em>\n</em><b></b>world</p></div>"),
+                         "<div><p>Hello world</p></div>")
+
+    def test_empty_elements_are_removed(self) -> None:
+        self.assertEqual(self.optimize("<div><p>Text</p>\n<div> </div>\n<p><span></span></p></div>"),
+                         "<div><p>Text</p></div>")
+
+    def test_link_targets_are_kept(self) -> None:
+        self.assertEqual(self.optimize('<div><p>Text<a href="#fn1">1</a></p><p><a name="fn1"></a>Note</p>'
+                                       '<p><a name="unused" data-x="1">Other</a></p></div>'),
+                         '<div><p>Text<a href="#fn1">1</a></p><p><a name="fn1"></a>Note</p><p><a>Other</a></p></div>')
+
+
+if __name__ == "__main__":
+    unittest.main()
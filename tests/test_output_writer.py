@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import stat
+import tempfile
+import unittest
+from shutil import rmtree
+
+from respykt.output_writer import IncrementalWriter
+
+
+class IncrementalWriterTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+        self.writer = IncrementalWriter(base_dir=self.temp_dir)
+        self.umask = os.umask(0o022)
+
+    def tearDown(self) -> None:
+        os.umask(self.umask)
+        rmtree(self.temp_dir, ignore_errors=True)
+
+    def get_mode(self, filename: str) -> int:
+        return stat.S_IMODE(os.stat(os.path.join(self.temp_dir, filename)).st_mode)
+
+    def test_unchanged_file_is_skipped(self) -> None:
+        filepath = os.path.join(self.temp_dir, "toc.html")
+        self.assertTrue(self.writer.write_text(filepath, "obsah"))
+        self.assertFalse(self.writer.write_text(filepath, "obsah"))
+        self.assertEqual(self.writer.manifest["toc.html"]["action"], "skipped")
+        self.assertTrue(self.writer.write_text(filepath, "jiný obsah"))
+        self.assertEqual(self.writer.manifest["toc.html"]["action"], "written")
+
+    def test_file_edited_on_disk_is_written_again(self) -> None:
+        filepath = os.path.join(self.temp_dir, "toc.html")
+        self.writer.write_text(filepath, "obsah")
+        # same size, different content
+        with open(filepath, mode="w", encoding="utf-8-sig") as fw:
+            fw.write("OBSAH")
+        self.assertTrue(self.writer.write_text(filepath, "obsah"))
+        with open(filepath, mode="r", encoding="utf-8-sig") as fr:
+            self.assertEqual(fr.read(), "obsah")
+
+    def test_permissions_follow_umask_or_existing_file(self) -> None:
+        self.writer.write_text(os.path.join(self.temp_dir, "new.html"), "obsah")
+        self.assertEqual(self.get_mode("new.html"), 0o644)
+        os.chmod(os.path.join(self.temp_dir, "new.html"), 0o600)
+        self.writer.write_text(os.path.join(self.temp_dir, "new.html"), "jiný obsah")
+        self.assertEqual(self.get_mode("new.html"), 0o600)
+        self.assertEqual([name for name in os.listdir(self.temp_dir) if name.endswith(".tmp")], [])
+
+    def test_linked_file_and_manifest(self) -> None:
+        source = os.path.join(self.temp_dir, "source.css")
+        with open(source, mode="w", encoding="utf-8") as fw:
+            fw.write("p{margin:0}")
+        dest = os.path.join(self.temp_dir, "style.css")
+        self.assertIn(self.writer.link_file(source, dest), ("linked", "reflinked", "copied"))
+        self.assertEqual(self.writer.link_file(source, dest), "skipped")
+        self.writer.write_text(os.path.join(self.temp_dir, "toc.html"), "obsah")
+
+        self.writer.save_manifest()
+        with open(os.path.join(self.temp_dir, "manifest.json"), mode="r", encoding="utf-8") as fr:
+            manifest = json.load(fr)
+        self.assertEqual(manifest, {
+            "style.css": {"action": "skipped", "hash": IncrementalWriter.hash_file(source)},
+            "toc.html": {"action": "written", "hash": IncrementalWriter.hash_bytes("obsah".encode("utf-8-sig"))}})
+        # every run starts with empty manifest
+        self.assertEqual(self.writer.manifest, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
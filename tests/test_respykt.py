@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import os
+import tempfile
+import unittest
+from shutil import rmtree
+
+from respykt.respykt import Respykt
+from tests.standin_site import StandinSite
+
+RESOURCES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "resources")
+
+
+class DateRangeTest(unittest.TestCase):
+
+    def test_date_range_within_month_and_across_months(self) -> None:
+        self.assertEqual(Respykt.get_date_range_from_datestring("9/2019, 18. – 24. 2. 2019"),
+                         ("2019-02-18", "2019-02-24"))
+        self.assertEqual(Respykt.get_date_range_from_datestring("9/2019, 25. 2. – 3. 3. 2019"),
+                         ("2019-02-25", "2019-03-03"))
+
+    def test_date_range_across_new_year(self) -> None:
+        self.assertEqual(Respykt.get_date_range_from_datestring("1/2020, 30. 12. – 5. 1. 2020"),
+                         ("2019-12-30", "2020-01-05"))
+        self.assertEqual(Respykt.get_date_range_from_datestring("1/2003, 23. 12. 2002–2. 1. 2003"),
+                         ("2002-12-23", "2003-01-02"))
+
+    def test_date_is_first_day_of_issue(self) -> None:
+        self.assertEqual(Respykt.get_date_from_datestring("9/2019, 18. – 24. 2. 2019"), "20190218")
+        self.assertEqual(Respykt.get_date_from_datestring("9/2019, 25. 2. – 3. 3. 2019"), "20190225")
+        self.assertEqual(Respykt.get_date_from_datestring("1/2020, 30. 12. – 5. 1. 2020"), "20191230")
+        self.assertEqual(Respykt.get_date_from_datestring("1/2003, 23. 12. 2002–2. 1. 2003"), "20021223")
+
+
+
+class ArticleStreamTest(unittest.TestCase):
+    """
+    Downloads issue 9 of the stand-in site article by article
+    """
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+        self.site = StandinSite().start()
+        config_file = os.path.join(self.temp_dir, "config.ini")
+        with open(config_file, mode="w", encoding="utf-8") as fw:
+            fw.write("[FOLDERS]\n"
+                     "static = {static}\n"
+                     "templates = {templates}\n"
+                     "mako_modules = {modules}\n"
+                     "[DOWNLOAD]\n"
+                     "wait_time = 0\n".format(static=os.path.join(RESOURCES_DIR, "static"),
+                                              templates=os.path.join(RESOURCES_DIR, "templates"),
+                                              modules=os.path.join(self.temp_dir, "mako_modules")))
+        self.respykt = Respykt(config_file, issue_dir=os.path.join(self.temp_dir, "issue"),
+                               home_url=self.site.home_url)
+        self.respykt.set_issue(2019, 9)
+
+    def tearDown(self) -> None:
+        self.site.shutdown()
+        self.site.server_close()
+        rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_next_article_is_downloaded_when_asked_for(self) -> None:
+        articles = self.respykt.iter_articles()
+        self.assertEqual(self.site.hits, {})
+        first = next(articles)
+        self.assertIn("prvni", first["url"])
+        self.assertEqual(self.site.hits.get("/tydenik/2019/9/prvni"), 1)
+        self.assertIsNone(self.site.hits.get("/tydenik/2019/9/druhy"))
+        next(articles)
+        self.assertEqual(self.site.hits.get("/tydenik/2019/9/druhy"), 1)
+
+    def test_content_is_released_after_consumer_is_done(self) -> None:
+        for article in self.respykt.iter_articles(release_content=True):
+            self.assertIn("Text článku", article["content"])
+        self.assertTrue(all("content" not in article for article in self.respykt.articles))
+
+    def test_exported_articles_can_be_rendered(self) -> None:
+        buffer = io.StringIO()
+        self.assertEqual(self.respykt.export_ndjson(buffer), 2)
+        records = [json.loads(line) for line in buffer.getvalue().splitlines()]
+        self.assertEqual([record["title"] for record in records], ["Článek & prvni", "Článek & druhy"])
+        self.assertEqual(records[0]["issue"]["number"], "9")
+        self.assertIn("Text článku prvni", records[0]["content"])
+
+        # content is kept by default, so the issue can still be rendered
+        self.respykt.write_files()
+        with open(os.path.join(self.temp_dir, "issue", "text", "article_0102.html"), encoding="utf-8-sig") as fr:
+            self.assertIn("Text článku druhy", fr.read())
+
+    def test_export_can_release_content(self) -> None:
+        buffer = io.StringIO()
+        self.assertEqual(self.respykt.export_ndjson(buffer, release_content=True), 2)
+        self.assertIn("Text článku druhy", buffer.getvalue())
+        self.assertTrue(all("content" not in article for article in self.respykt.articles))
+
+
+if __name__ == "__main__":
+    unittest.main()